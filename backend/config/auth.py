@@ -1,28 +1,101 @@
 # config/auth.py
 import os
+import time
+import hashlib
 import requests
+import jwt
 from dotenv import load_dotenv
 
 from typing import Optional
 
+from utils.cache import TTLCache
+
 load_dotenv()
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 
+# Local verification: set SUPABASE_JWT_SECRET for projects that sign tokens
+# with the shared HS256 secret, or SUPABASE_JWKS_URL for asymmetric signing
+# keys.  When neither is set, every token is checked against /auth/v1/user.
+SUPABASE_JWT_SECRET   = os.getenv("SUPABASE_JWT_SECRET")
+SUPABASE_JWKS_URL     = os.getenv("SUPABASE_JWKS_URL")
+SUPABASE_JWT_AUDIENCE = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+JWKS_CACHE_TTL        = int(os.getenv("JWKS_CACHE_TTL", "600"))     # seconds
+
+# Verified users keyed by sha256(token).  Entries never outlive the token.
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+AUTH_CACHE_TTL  = int(os.getenv("AUTH_CACHE_TTL", "300"))           # seconds
+
+_token_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
+
+# Keep-alive connection pool for the remote fallback; sized for the API
+# threadpool so concurrent verifications do not open a socket each.
+_http = requests.Session()
+_http_adapter = requests.adapters.HTTPAdapter(
+    pool_maxsize=int(os.getenv("API_THREADPOOL_SIZE", "64"))
+)
+_http.mount("https://", _http_adapter)
+_http.mount("http://", _http_adapter)
+
+_jwks_client = None
+if SUPABASE_JWKS_URL and not SUPABASE_JWT_SECRET:
+    _jwks_client = jwt.PyJWKClient(
+        SUPABASE_JWKS_URL,
+        cache_jwk_set=True,
+        lifespan=JWKS_CACHE_TTL,
+        headers={"apikey": SUPABASE_KEY} if SUPABASE_KEY else None,
+        timeout=5,
+    )
+
 
 class SupabaseAuthError(Exception):
     pass
 
-def verify_supabase_token(token: str) -> dict:
-    """
-    Verify an access token by calling Supabase auth endpoint.
 
-    Returns the user payload (dict) on success. Raises SupabaseAuthError on failure.
-    """
-    if not token:
-        raise SupabaseAuthError("missing token")
+def local_verification_enabled() -> bool:
+    return bool(SUPABASE_JWT_SECRET or _jwks_client)
+
 
+def _user_from_claims(claims: dict) -> dict:
+    """Shape verified JWT claims like the /auth/v1/user payload routes expect."""
+    return {
+        "id":            claims["sub"],
+        "aud":           claims.get("aud"),
+        "role":          claims.get("role"),
+        "email":         claims.get("email"),
+        "phone":         claims.get("phone"),
+        "app_metadata":  claims.get("app_metadata") or {},
+        "user_metadata": claims.get("user_metadata") or {},
+    }
+
+
+def _verify_locally(token: str) -> tuple[dict, float]:
+    """Check signature, expiry and audience without leaving the process."""
+    try:
+        if SUPABASE_JWT_SECRET:
+            key = SUPABASE_JWT_SECRET
+            algorithms = ["HS256"]
+        else:
+            key = _jwks_client.get_signing_key_from_jwt(token).key
+            algorithms = ["RS256", "ES256"]
+        claims = jwt.decode(
+            token,
+            key,
+            algorithms=algorithms,
+            audience=SUPABASE_JWT_AUDIENCE,
+            options={"require": ["exp", "sub"]},
+        )
+    except jwt.ExpiredSignatureError as e:
+        raise SupabaseAuthError("token expired") from e
+    except (jwt.InvalidTokenError, jwt.PyJWKClientError) as e:
+        raise SupabaseAuthError(f"invalid token: {e}") from e
+
+    return _user_from_claims(claims), claims["exp"]
+
+
+def _verify_remotely(token: str) -> tuple[dict, float | None]:
+    """Ask the Supabase auth endpoint who the token belongs to."""
     if not SUPABASE_URL:
         raise SupabaseAuthError("Supabase URL not configured")
 
@@ -35,7 +108,7 @@ def verify_supabase_token(token: str) -> dict:
     if SUPABASE_KEY:
         headers["apikey"] = SUPABASE_KEY
 
-    resp = requests.get(url, headers=headers, timeout=5)
+    resp = _http.get(url, headers=headers, timeout=5)
     if resp.status_code != 200:
         raise SupabaseAuthError(f"invalid token or auth failed: {resp.status_code}")
 
@@ -44,7 +117,48 @@ def verify_supabase_token(token: str) -> dict:
     except Exception as e:
         raise SupabaseAuthError("failed reading supabase response") from e
 
-    return data
+    # The signature was just checked by Supabase; only read exp to bound caching.
+    try:
+        exp = jwt.decode(token, options={"verify_signature": False}).get("exp")
+    except jwt.InvalidTokenError:
+        exp = None
+
+    return data, exp
+
+
+def verify_supabase_token(token: str) -> dict:
+    """
+    Verify an access token and return the user payload (dict).
+
+    Tokens are verified locally when SUPABASE_JWT_SECRET or SUPABASE_JWKS_URL
+    is configured, otherwise by calling the Supabase auth endpoint.  Verified
+    users are cached by token hash until the cache TTL or the token's expiry,
+    whichever comes first.  Raises SupabaseAuthError on failure.
+    """
+    if not token:
+        raise SupabaseAuthError("missing token")
+
+    cache_key = hashlib.sha256(token.encode()).hexdigest()
+    user = _token_cache.get(cache_key)
+    if user is not None:
+        return user
+
+    if local_verification_enabled():
+        user, exp = _verify_locally(token)
+    else:
+        user, exp = _verify_remotely(token)
+
+    ttl = AUTH_CACHE_TTL
+    if exp is not None:
+        ttl = min(ttl, exp - time.time())
+    if ttl > 0:
+        _token_cache.set(cache_key, user, ttl=ttl)
+
+    return user
+
+
+def auth_cache_stats() -> dict:
+    return _token_cache.stats()
 
 
 # FastAPI dependency helper to reuse across routes
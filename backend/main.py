@@ -1,3 +1,4 @@
+from anyio import to_thread
 from fastapi import FastAPI
 from routes.database import router as database_router
 from routes.documents import router as documents_router
@@ -8,12 +9,24 @@ from fastapi.middleware.cors import CORSMiddleware
 from config.supabase import supabase
 from config.gemini import client
 from workers.processor import start_background_worker
+from services.notification_bus import start_notification_listener
+from services.notification_sink import flush_notifications
+from services.text_index import start_text_index
+from services.vector_index import start_vector_index
 # uvicorn main:app --reload
 # cloudflared tunnel run scholarsync-backend
 import os
 
 app = FastAPI()
 
+# Threads shared by sync routes, sync dependencies and run_in_threadpool();
+# every Supabase/Gemini call made while serving a request runs on one of them.
+API_THREADPOOL_SIZE = int(os.getenv("API_THREADPOOL_SIZE", "64"))
+# Run the document processor inside each API process.  Set EMBEDDED_WORKER=0
+# when running `python -m workers` separately (e.g. with
+# `uvicorn --workers N`, so N API processes do not each start a worker).
+EMBEDDED_WORKER = os.getenv("EMBEDDED_WORKER", "1") == "1"
+
 # Base allowed origins; extend via EXTRA_CORS_ORIGINS env var (comma-separated)
 _base_origins = [
     "http://127.0.0.1:5500",
@@ -38,7 +51,24 @@ app.include_router(documents_router)
 app.include_router(notifications_router)
 
 
+@app.on_event("startup")
+async def configure_threadpool():
+    to_thread.current_default_thread_limiter().total_tokens = API_THREADPOOL_SIZE
+
+
 @app.on_event("startup")
 def startup_event():
-    print("[MAIN] Starting background document processor …")
-    start_background_worker()
+    if EMBEDDED_WORKER:
+        print("[MAIN] Starting background document processor …")
+        start_background_worker()
+    else:
+        print("[MAIN] Embedded document processor disabled (EMBEDDED_WORKER=0)")
+    start_notification_listener()
+    start_vector_index()
+    start_text_index()
+
+
+@app.on_event("shutdown")
+def shutdown_event():
+    # Write notifications still waiting in the write-behind buffer
+    flush_notifications()
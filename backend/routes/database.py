@@ -1,6 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Body, Depends, HTTPException
 from config.supabase import supabase
-from config.auth import get_current_user
+from config.auth import get_current_user, auth_cache_stats
+from services.profile_service import get_profile, invalidate_profile, profile_cache_stats
+from services.search_cache import search_cache_stats
+from services.gemini_scheduler import gemini_scheduler_stats
+from services.notification_bus import notification_bus_stats
+from services.notification_sink import notification_sink_stats, queue_notification
+from services.visibility_service import visible_groups_cache_stats
 
 
 router = APIRouter()
@@ -19,6 +25,7 @@ def create_profile(current_user: dict = Depends(get_current_user)):
     if not resp.data:
         raise HTTPException(status_code=400, detail="Failed to create profile")
 
+    invalidate_profile(user_id)
     return resp.data[0]
 
 @router.post("/create-university/{university_name}")
@@ -31,6 +38,7 @@ def create_university(university_name: str, current_user: dict = Depends(get_cur
     university_id = uni_resp.data[0]["university_id"]
 
     supabase.table("profiles").update({"role": "admin", "university_id": university_id}).eq("id", user_id).execute()
+    invalidate_profile(user_id)
 
     return {"message": "You are now admin"}
 
@@ -52,11 +60,10 @@ def apply_to_join_university(university_id: str, current_user: dict = Depends(ge
 def get_all_join_requests(university_id: str, current_user: dict = Depends(get_current_user)):
     user_id = current_user.get("id")
 
-    profile_resp = supabase.table("profiles").select("*").eq("id", user_id).execute()
-    if not profile_resp.data:
+    profile = get_profile(user_id)
+    if profile is None:
         raise HTTPException(status_code=404, detail="Profile not found")
 
-    profile = profile_resp.data[0]
     if profile["role"] != "admin" or profile["university_id"] != university_id:
         raise HTTPException(status_code=403, detail="Not authorized to view join requests")
 
@@ -67,23 +74,18 @@ def get_all_join_requests(university_id: str, current_user: dict = Depends(get_c
 def get_user_profile(current_user: dict = Depends(get_current_user)):
     user_id = current_user.get("id")
 
-    resp = supabase.table("profiles") \
-        .select("*") \
-        .eq("id", user_id) \
-        .execute()
-
-    if not resp.data:
+    profile = get_profile(user_id)
+    if profile is None:
         raise HTTPException(status_code=404, detail="Profile not found")
 
-    return resp.data[0]
+    return profile
 
 @router.post("/handle-join-request")
-async def handle_join_request(
-    request: Request,
+def handle_join_request(
+    body: dict = Body(...),
     current_user: dict = Depends(get_current_user)
 ):
     try:
-        body = await request.json()
         request_id = body.get("request_id")
         action = body.get("action")
 
@@ -96,16 +98,10 @@ async def handle_join_request(
         admin_id = current_user.get("id")
 
         # 1️⃣ Verify admin
-        admin_profile = supabase.table("profiles") \
-            .select("*") \
-            .eq("id", admin_id) \
-            .execute()
-
-        if not admin_profile.data:
+        profile = get_profile(admin_id)
+        if profile is None:
             raise HTTPException(status_code=404, detail="Profile not found")
 
-        profile = admin_profile.data[0]
-
         if profile["role"] != "admin":
             raise HTTPException(status_code=403, detail="Only admin can handle requests")
 
@@ -136,6 +132,7 @@ async def handle_join_request(
 
             if not update_profile.data:
                 raise HTTPException(status_code=500, detail="Failed to update user profile")
+            invalidate_profile(join_request["requester_id"])
 
             # Notify the accepted user
             try:
@@ -144,12 +141,12 @@ async def handle_join_request(
                     .eq("university_id", university_id) \
                     .execute()
                 uni_name = uni_resp.data[0]["name"] if uni_resp.data else "your university"
-                supabase.table("notifications").insert({
+                queue_notification({
                     "user_id": join_request["requester_id"],
                     "type":    "application_accepted",
                     "title":   "Application accepted",
                     "message": f"You have been accepted as a faculty member of {uni_name}.",
-                }).execute()
+                })
             except Exception as notif_exc:
                 print(f"WARNING – could not create acceptance notification: {notif_exc}")
 
@@ -168,4 +165,18 @@ async def handle_join_request(
         raise
     except Exception as e:
         print("ERROR:", e)
-        raise HTTPException(status_code=500, detail="Internal server error")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.get("/cache-stats")
+def cache_stats(current_user: dict = Depends(get_current_user)):
+    """Hit/miss counters for the in-process caches and Gemini scheduler state of this worker process."""
+    return {
+        "auth":     auth_cache_stats(),
+        "profiles": profile_cache_stats(),
+        "search":   search_cache_stats(),
+        "visible_groups": visible_groups_cache_stats(),
+        "gemini":   gemini_scheduler_stats(),
+        "notification_streams": notification_bus_stats(),
+        "notification_sink":    notification_sink_stats(),
+    }
@@ -1,105 +1,209 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Body
+import asyncio
+import base64
+import json
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Body, Query, Request
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 from config.supabase import supabase
 from config.auth import get_current_user
-from config.gemini import client as gemini_client
+from services import gemini_scheduler, search_cache, text_index, vector_index
+from services.embedding_service import EMBED_MODEL, embed_texts
+from services.gemini_scheduler import INTERACTIVE
+from services.profile_service import get_profile
+from services.upload_service import staged_upload, upload_to_storage
+from services.visibility_service import invalidate_visible_groups, visible_group_ids
+from utils.http_cache import cache_headers, list_version, not_modified, parse_since, version_etag
+from workers.processor import notify_new_document
 
 router = APIRouter()
 
 GEN_MODEL        = "gemini-2.0-flash"
-EMBED_MODEL      = "gemini-embedding-001"
 BUCKET           = "scholar-sync-documents"
 SIGNED_URL_TTL   = 300          # seconds (5 minutes)
 HYDE_DELIMITER   = "_$_"        # separator Gemini uses between HyDE phrases
+# HyDE phrase vectors are matched concurrently on a shared pool; each request
+# may occupy at most SEARCH_PHRASE_CONCURRENCY of its threads.
+SEARCH_POOL_SIZE          = int(os.getenv("SEARCH_POOL_SIZE", "16"))
+SEARCH_PHRASE_CONCURRENCY = int(os.getenv("SEARCH_PHRASE_CONCURRENCY", "4"))
+# Distinct groups wanted per phrase, rows fetched per wanted group, and the
+# ceiling for the adaptive over-fetch
+SEARCH_MATCH_GROUPS    = 10
+SEARCH_OVERFETCH       = int(os.getenv("SEARCH_OVERFETCH", "3"))
+SEARCH_MAX_MATCH_COUNT = int(os.getenv("SEARCH_MAX_MATCH_COUNT", "200"))
+# "mean": one retrieval for the averaged HyDE phrase vectors; "rrf": one per
+# phrase.  Either way the vector and BM25 rankings are merged with reciprocal
+# rank fusion.
+SEARCH_VECTOR_FUSION        = os.getenv("SEARCH_VECTOR_FUSION", "mean").strip().lower()
+SEARCH_RRF_K                = 60
+SEARCH_RRF_CHUNKS_PER_GROUP = 3
+# /documents-visible-to-user page size and the most a client may ask for
+DOCUMENTS_PAGE_SIZE     = int(os.getenv("DOCUMENTS_PAGE_SIZE", "100"))
+DOCUMENTS_MAX_PAGE_SIZE = int(os.getenv("DOCUMENTS_MAX_PAGE_SIZE", "500"))
+
+_search_pool = ThreadPoolExecutor(max_workers=SEARCH_POOL_SIZE, thread_name_prefix="search")
 
 
 # ── Helpers ───────────────────────────────────────────────────────────────────
 
 def _get_profile(user_id: str) -> dict:
-    resp = supabase.table("profiles").select("*").eq("id", user_id).execute()
-    if not resp.data:
+    profile = get_profile(user_id)
+    if profile is None:
         raise HTTPException(status_code=404, detail="Profile not found")
-    return resp.data[0]
+    return profile
 
 
-def _embed(text: str):
-    resp = gemini_client.models.embed_content(model=EMBED_MODEL, content=text)
-    return resp.embeddings[0].values
+def _encode_cursor(sort_value: str, doc_group_id: str) -> str:
+    raw = json.dumps([sort_value, doc_group_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
 
-@router.get("/documents-visible-to-user")
-def documents_visible_to_user(current_user: dict = Depends(get_current_user)):
-    user_id = current_user.get("id")
 
-    # Get user profile
-    profile = supabase.table("profiles") \
-        .select("university_id") \
-        .eq("id", user_id) \
-        .execute()
+def _decode_cursor(cursor: str) -> tuple:
+    """
+    (sort timestamp, doc_group_id) of a cursor.  Both end up in a PostgREST
+    filter, so they are parsed and re-serialised rather than passed through.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_value, doc_group_id = json.loads(raw)
+        sort_value = datetime.fromisoformat(str(sort_value).replace("Z", "+00:00")).isoformat()
+        return sort_value, str(uuid.UUID(str(doc_group_id)))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
-    if not profile.data:
-        raise HTTPException(status_code=404, detail="Profile not found")
 
-    university_id = profile.data[0].get("university_id")
+@router.get("/documents-visible-to-user")
+def documents_visible_to_user(
+    request: Request,
+    cursor: str | None = Query(None),
+    limit: int = Query(DOCUMENTS_PAGE_SIZE, ge=1),
+    since: str | None = Query(None),
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    One page of the visible groups' active documents, newest group first.
+    Pages are keyed on (created_at, doc_group_id); pass the returned
+    ``next_cursor`` back to continue, it is null on the last page.
 
-    # Single relational query: fetch visible groups with all their document versions
-    groups_resp = supabase.table("document_groups") \
+    With ``since`` only groups updated after it are returned, oldest change
+    first and keyed on (updated_at, doc_group_id).  Responses carry an ETag
+    and answer 304 while the visible groups are unchanged.
+    """
+    user_id = current_user.get("id")
+    limit = min(limit, DOCUMENTS_MAX_PAGE_SIZE)
+    since = parse_since(since)
+
+    # Get user profile
+    university_id = _get_profile(user_id).get("university_id")
+    visibility = f"scope.eq.global,created_by.eq.{user_id},university_id.eq.{university_id}"
+
+    etag = version_etag(request, user_id, *list_version(
+        supabase.table("document_groups")
+            .select("updated_at", count="exact")
+            .or_(visibility)
+    ))
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+
+    # Join only the active version; !inner drops groups without one
+    query = supabase.table("document_groups") \
         .select(
-            "doc_group_id, title, scope, active_document_id, "
-            "documents(document_id, group_id, status, human_description, ai_description, created_at)"
+            "doc_group_id, title, scope, created_at, updated_at, "
+            "active:documents!active_document_id!inner("
+            "document_id, group_id, status, human_description, ai_description, created_at)"
         ) \
-        .or_(f"scope.eq.global,created_by.eq.{user_id},university_id.eq.{university_id}") \
-        .execute()
+        .or_(visibility)
 
-    results = []
+    if since:
+        sort_key, op, descending = "updated_at", "gt", False
+        query = query.gt("updated_at", since)
+    else:
+        sort_key, op, descending = "created_at", "lt", True
 
-    for group in groups_resp.data:
-        active_id = group.get("active_document_id")
-        if not active_id:
-            continue
+    if cursor:
+        after_value, after_group = _decode_cursor(cursor)
+        query = query.or_(
+            f'{sort_key}.{op}."{after_value}",'
+            f'and({sort_key}.eq."{after_value}",doc_group_id.{op}.{after_group})'
+        )
 
-        docs = group.get("documents") or []
-        active_doc = next((d for d in docs if d.get("document_id") == active_id), None)
-
-        if active_doc:
-            results.append({
-                "document_id":       active_doc.get("document_id"),
-                "group_id":          active_doc.get("group_id"),
-                "title":             group["title"],
-                "scope":             group["scope"],
-                "human_description": active_doc.get("human_description"),
-                "ai_description":    active_doc.get("ai_description"),
-                "status":            active_doc.get("status"),
-                "is_active":         True,
-                "created_at":        active_doc.get("created_at"),
-            })
+    # One extra row tells us whether another page follows
+    groups_resp = query \
+        .order(sort_key, desc=descending) \
+        .order("doc_group_id", desc=descending) \
+        .limit(limit + 1) \
+        .execute()
 
-    return results
+    groups = groups_resp.data or []
+    page = groups[:limit]
+
+    results = []
+    for group in page:
+        active_doc = group.get("active") or {}
+        results.append({
+            "document_id":       active_doc.get("document_id"),
+            "group_id":          active_doc.get("group_id"),
+            "title":             group["title"],
+            "scope":             group["scope"],
+            "human_description": active_doc.get("human_description"),
+            "ai_description":    active_doc.get("ai_description"),
+            "status":            active_doc.get("status"),
+            "is_active":         True,
+            "created_at":        active_doc.get("created_at"),
+            "updated_at":        group.get("updated_at"),
+        })
+
+    next_cursor = None
+    if len(groups) > limit:
+        last = page[-1]
+        next_cursor = _encode_cursor(last[sort_key], last["doc_group_id"])
+
+    return JSONResponse(
+        {"documents": results, "next_cursor": next_cursor},
+        headers=cache_headers(etag),
+    )
 
 @router.get("/my-document-groups")
-def my_document_groups(current_user: dict = Depends(get_current_user)):
+def my_document_groups(
+    request: Request,
+    since: str | None = Query(None),
+    current_user: dict = Depends(get_current_user),
+):
     user_id = current_user.get("id")
+    since = parse_since(since)
 
-    profile = supabase.table("profiles") \
-        .select("*") \
-        .eq("id", user_id) \
-        .execute()
+    university_id = _get_profile(user_id).get("university_id")
+    ownership = f"created_by.eq.{user_id},university_id.eq.{university_id}"
 
-    if not profile.data:
-        raise HTTPException(status_code=404, detail="Profile not found")
-
-    university_id = profile.data[0].get("university_id")
+    etag = version_etag(request, user_id, *list_version(
+        supabase.table("document_groups")
+            .select("updated_at", count="exact")
+            .or_(ownership)
+    ))
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
 
-    groups = supabase.table("document_groups") \
-         .select("doc_group_id, title, scope") \
-        .or_(f"created_by.eq.{user_id},university_id.eq.{university_id}") \
-        .order("title") \
-        .execute()
+    query = supabase.table("document_groups") \
+        .select("doc_group_id, title, scope, updated_at") \
+        .or_(ownership)
+    if since:
+        query = query.gt("updated_at", since)
+    groups = query.order("title").execute()
 
-    return groups.data
+    return JSONResponse(groups.data, headers=cache_headers(etag))
 
 import uuid
 
+# Upload and edit routes are plain ``def`` so FastAPI runs them on the sized
+# worker threadpool instead of blocking the event loop with Supabase calls.
 @router.post("/create-document-group-and-upload")
-async def create_document_group_and_upload(
+def create_document_group_and_upload(
     title: str = Form(...),
     description: str = Form(""),
     scope: str = Form("local"),
@@ -109,39 +213,33 @@ async def create_document_group_and_upload(
     user_id = current_user.get("id")
 
     # Get profile
-    profile = supabase.table("profiles") \
-        .select("*") \
-        .eq("id", user_id) \
-        .execute()
-
-    if not profile.data:
-        raise HTTPException(status_code=404, detail="Profile not found")
-
-    university_id = profile.data[0].get("university_id")
+    university_id = _get_profile(user_id).get("university_id")
 
     if scope not in {"local", "global"}:
         raise HTTPException(status_code=400, detail="Scope must be local or global")
 
-    # 1️⃣ Create document group
-    group_resp = supabase.table("document_groups").insert({
-        "title": title,
-        "scope": scope,
-        "created_by": user_id,
-        "university_id": university_id
-    }).execute()
+    # Spool the file first so an oversized upload is rejected before any row exists
+    with staged_upload(file) as staged:
 
-    if not group_resp.data:
-        raise HTTPException(status_code=400, detail="Failed to create group")
+        # 1️⃣ Create document group
+        group_resp = supabase.table("document_groups").insert({
+            "title": title,
+            "scope": scope,
+            "created_by": user_id,
+            "university_id": university_id
+        }).execute()
 
-    group_id = group_resp.data[0]["doc_group_id"]
+        if not group_resp.data:
+            raise HTTPException(status_code=400, detail="Failed to create group")
 
-    # 2️⃣ Upload file to storage
-    file_id = str(uuid.uuid4())
-    path = f"{university_id}/{group_id}/{file_id}_{file.filename}"
+        group_id = group_resp.data[0]["doc_group_id"]
+        invalidate_visible_groups()
 
-    file_bytes = await file.read()
+        # 2️⃣ Upload file to storage
+        file_id = str(uuid.uuid4())
+        path = f"{university_id}/{group_id}/{file_id}_{file.filename}"
 
-    supabase.storage.from_("scholar-sync-documents").upload(path, file_bytes)
+        upload_to_storage(BUCKET, path, staged)
 
     # 3️⃣ Insert document record
     doc_resp = supabase.table("documents").insert({
@@ -149,6 +247,8 @@ async def create_document_group_and_upload(
         "version_number": 1,
         "file_name": file.filename,
         "file_path": path,
+        "file_size": staged.size,
+        "file_sha256": staged.sha256,
         "human_description": description,
         "status": "uploaded"
     }).execute()
@@ -161,10 +261,12 @@ async def create_document_group_and_upload(
         .eq("doc_group_id", group_id) \
         .execute()
 
+    notify_new_document()
+
     return {"message": "Document uploaded successfully"}
 
 @router.post("/upload-new-version")
-async def upload_new_version(
+def upload_new_version(
     group_id: str = Form(...),
     description: str = Form(""),
     file: UploadFile = File(...),
@@ -183,25 +285,25 @@ async def upload_new_version(
 
     university_id = group.data[0].get("university_id")
 
-    # Get latest version
-    latest = supabase.table("documents") \
-        .select("version_number") \
-        .eq("group_id", group_id) \
-        .order("version_number", desc=True) \
-        .limit(1) \
-        .execute()
+    with staged_upload(file) as staged:
 
-    next_version = 1
-    if latest.data:
-        next_version = latest.data[0]["version_number"] + 1
+        # Get latest version
+        latest = supabase.table("documents") \
+            .select("version_number") \
+            .eq("group_id", group_id) \
+            .order("version_number", desc=True) \
+            .limit(1) \
+            .execute()
 
-    # Upload file
-    file_id = str(uuid.uuid4())
-    path = f"{university_id}/{group_id}/v{next_version}_{file_id}_{file.filename}"
+        next_version = 1
+        if latest.data:
+            next_version = latest.data[0]["version_number"] + 1
 
-    file_bytes = await file.read()
+        # Upload file
+        file_id = str(uuid.uuid4())
+        path = f"{university_id}/{group_id}/v{next_version}_{file_id}_{file.filename}"
 
-    supabase.storage.from_("scholar-sync-documents").upload(path, file_bytes)
+        upload_to_storage(BUCKET, path, staged)
 
     # Insert new document
     doc_resp = supabase.table("documents").insert({
@@ -209,6 +311,8 @@ async def upload_new_version(
         "version_number": next_version,
         "file_name": file.filename,
         "file_path": path,
+        "file_size": staged.size,
+        "file_sha256": staged.sha256,
         "human_description": description,
         "status": "uploaded"
     }).execute()
@@ -221,6 +325,8 @@ async def upload_new_version(
         .eq("doc_group_id", group_id) \
         .execute()
 
+    notify_new_document()
+
     return {"message": "New version uploaded"}
 
 
@@ -280,7 +386,7 @@ def get_document_group(group_id: str, current_user: dict = Depends(get_current_u
 # ── Version Detail / Edit ─────────────────────────────────────────────────────
 
 @router.patch("/document/{document_id}")
-async def update_document(
+def update_document(
     document_id: str,
     body: dict = Body(...),
     current_user: dict = Depends(get_current_user),
@@ -406,6 +512,7 @@ def download_document(document_id: str, current_user: dict = Depends(get_current
 # ── Search helpers ─────────────────────────────────────────────────────────────
 
 def _visible_group_result(grp: dict, user_id: str, university_id: str | None,
+                          active_doc: dict | None = None,
                           similarity: float | None = None) -> dict | None:
     """Build a result dict for a document group if the user can see it."""
     scope = grp.get("scope")
@@ -419,12 +526,7 @@ def _visible_group_result(grp: dict, user_id: str, university_id: str | None,
         return None
 
     active_id = grp.get("active_document_id")
-    active_doc = {}
-    if active_id:
-        ad = supabase.table("documents").select("*") \
-            .eq("document_id", active_id).execute()
-        if ad.data:
-            active_doc = ad.data[0]
+    active_doc = active_doc or {}
 
     result = {
         "group_id":          grp.get("doc_group_id"),
@@ -442,39 +544,92 @@ def _visible_group_result(grp: dict, user_id: str, university_id: str | None,
     return result
 
 
+def _hydrate_groups(group_ids: list, user_id: str, university_id: str | None,
+                    similarities: dict | None = None,
+                    groups: dict | None = None) -> list:
+    """
+    Turn an ordered list of group ids into visible search results.
+
+    Groups not already supplied in ``groups`` are fetched with one ``in_()``
+    query, and the active documents of the visible ones with a second, so the
+    cost is two round trips no matter how many ids are passed.  Result order
+    follows ``group_ids``; duplicates are dropped.
+    """
+    similarities = similarities or {}
+    groups = dict(groups or {})
+    ordered_ids = list(dict.fromkeys(gid for gid in group_ids if gid))
+
+    missing = [gid for gid in ordered_ids if gid not in groups]
+    if missing:
+        grp_resp = supabase.table("document_groups").select("*") \
+            .in_("doc_group_id", missing).execute()
+        for grp in (grp_resp.data or []):
+            groups[grp["doc_group_id"]] = grp
+
+    active_ids = list({
+        groups[gid]["active_document_id"]
+        for gid in ordered_ids
+        if gid in groups and groups[gid].get("active_document_id")
+    })
+    active_docs: dict = {}
+    if active_ids:
+        doc_resp = supabase.table("documents").select("*") \
+            .in_("document_id", active_ids).execute()
+        active_docs = {d["document_id"]: d for d in (doc_resp.data or [])}
+
+    results = []
+    for gid in ordered_ids:
+        grp = groups.get(gid)
+        if not grp:
+            continue
+        r = _visible_group_result(
+            grp, user_id, university_id,
+            active_doc=active_docs.get(grp.get("active_document_id")),
+            similarity=similarities.get(gid),
+        )
+        if r:
+            results.append(r)
+    return results
+
+
+def _chunk_text_matches(query: str, user_id: str, university_id: str | None) -> list:
+    """
+    Group ids whose chunks match ``query``, best first: BM25 over the
+    in-process text index when it is loaded, otherwise ILIKE on
+    document_chunks.text_content (unranked).
+    """
+    if text_index.ready():
+        visible_ids = visible_group_ids(user_id, university_id)
+        hits = text_index.search(query, 50, group_ids=visible_ids)
+        return list(dict.fromkeys(h["group_id"] for h in hits if h["group_id"]))
+
+    chunks_resp = supabase.table("document_chunks") \
+        .select("document_id") \
+        .ilike("text_content", f"%{query}%") \
+        .limit(50) \
+        .execute()
+
+    doc_ids = list(dict.fromkeys(c["document_id"] for c in (chunks_resp.data or [])))
+    if not doc_ids:
+        return []
+    doc_resp = supabase.table("documents").select("document_id, group_id") \
+        .in_("document_id", doc_ids).execute()
+    group_of = {d["document_id"]: d["group_id"] for d in (doc_resp.data or [])}
+    return [group_of[d] for d in doc_ids if d in group_of]
+
+
 def _text_search(query: str, user_id: str, university_id: str | None) -> list:
     """
-    Text-based search: ILIKE on document_chunks.text_content and
-    document_groups.title / documents.human_description.
+    Text-based search: chunk text (BM25 index or ILIKE) and ILIKE on
+    document_groups.title.
     """
     print(f"[SEARCH] Text search – query='{query}'")
-    seen: set = set()
-    results: list = []
+    group_ids: list = []
+    title_groups: dict = {}
 
     # 1) Search in document_chunks text_content
     try:
-        chunks_resp = supabase.table("document_chunks") \
-            .select("document_id") \
-            .ilike("text_content", f"%{query}%") \
-            .limit(50) \
-            .execute()
-
-        doc_ids = list({c["document_id"] for c in (chunks_resp.data or [])})
-        for doc_id in doc_ids:
-            doc_resp = supabase.table("documents").select("group_id") \
-                .eq("document_id", doc_id).execute()
-            if not doc_resp.data:
-                continue
-            gid = doc_resp.data[0]["group_id"]
-            if gid in seen:
-                continue
-            seen.add(gid)
-            grp_resp = supabase.table("document_groups").select("*") \
-                .eq("doc_group_id", gid).execute()
-            if grp_resp.data:
-                r = _visible_group_result(grp_resp.data[0], user_id, university_id)
-                if r:
-                    results.append(r)
+        group_ids.extend(_chunk_text_matches(query, user_id, university_id))
     except Exception as exc:
         print(f"[SEARCH] Chunk text search error: {exc}")
 
@@ -486,20 +641,120 @@ def _text_search(query: str, user_id: str, university_id: str | None) -> list:
             .limit(20) \
             .execute()
         for grp in (grp_resp.data or []):
-            gid = grp.get("doc_group_id")
-            if gid in seen:
-                continue
-            seen.add(gid)
-            r = _visible_group_result(grp, user_id, university_id)
-            if r:
-                results.append(r)
+            title_groups[grp["doc_group_id"]] = grp
+            group_ids.append(grp["doc_group_id"])
     except Exception as exc:
         print(f"[SEARCH] Title text search error: {exc}")
 
+    try:
+        results = _hydrate_groups(group_ids, user_id, university_id, groups=title_groups)
+    except Exception as exc:
+        print(f"[SEARCH] Text search hydration error: {exc}")
+        results = []
+
     print(f"[SEARCH] Text search returning {len(results)} results")
     return results
 
 
+def _hyde_phrases(query: str) -> tuple[list, bool]:
+    """
+    Ask Gemini for hypothetical document phrases.
+    Returns ``(phrases, generated)``; falls back to ``[query]`` on failure.
+    """
+    hyde_prompt = (
+        "You are a search engine assistant for an academic document repository. "
+        "Given the following user query, generate 3 short hypothetical phrases or "
+        "sentences that would likely appear in a matching academic document. "
+        f"Separate each phrase with the delimiter  {HYDE_DELIMITER}  and output nothing else.\n\n"
+        f"Query: {query}"
+    )
+    try:
+        hyde_resp = gemini_scheduler.generate_content(
+            GEN_MODEL, hyde_prompt, priority=INTERACTIVE
+        )
+        raw_phrases = hyde_resp.text.strip()
+        print(f"[SEARCH] Gemini HyDE phrases: {raw_phrases}")
+        phrases = [p.strip() for p in raw_phrases.split(HYDE_DELIMITER) if p.strip()]
+    except Exception as exc:
+        print(f"[SEARCH] Gemini HyDE generation failed: {exc} – falling back to query")
+        return [query], False
+
+    if not phrases:
+        return [query], False
+    return phrases, True
+
+
+def _compute_phrase_vectors(query: str) -> tuple[list, bool]:
+    """Generate HyDE phrases and embed them all in one batched request."""
+    phrases, generated = _hyde_phrases(query)
+    print(f"[SEARCH] Embedding {len(phrases)} phrase(s)")
+    vectors = embed_texts(phrases, priority=INTERACTIVE)
+    entries = [{"phrase": p, "vector": v} for p, v in zip(phrases, vectors)]
+    return entries, generated
+
+
+def _phrase_vectors(query: str) -> list:
+    """HyDE phrases and vectors for ``query``, served from the query cache when possible."""
+    return search_cache.get_or_compute(query, GEN_MODEL, EMBED_MODEL, _compute_phrase_vectors)
+
+
+def _match_vector(vector: list, visible_ids: list | None = None) -> list:
+    """
+    Return the vector matches for one phrase vector (runs on _search_pool).
+
+    With ``visible_ids`` the RPC ranks only those groups' rows.  Several
+    chunks of one group often outrank everything else, so SEARCH_MATCH_GROUPS
+    × SEARCH_OVERFETCH rows are requested, doubling (up to
+    SEARCH_MAX_MATCH_COUNT) while they hold fewer than SEARCH_MATCH_GROUPS
+    distinct groups and more rows may exist.
+    """
+    match_count = SEARCH_MATCH_GROUPS * SEARCH_OVERFETCH
+    while True:
+        params = {"query_vector": vector, "match_count": match_count}
+        if visible_ids is not None:
+            params["filter_group_ids"] = visible_ids
+        try:
+            rows = supabase.rpc("match_embeddings", params).execute().data or []
+        except Exception as exc:
+            print(f"[SEARCH] Vector search failed: {exc}")
+            return []
+        groups = {r.get("group_id") for r in rows}
+        if (len(groups) >= SEARCH_MATCH_GROUPS or len(rows) < match_count
+                or match_count >= SEARCH_MAX_MATCH_COUNT):
+            return rows
+        match_count = min(2 * match_count, SEARCH_MAX_MATCH_COUNT)
+
+
+def _mean_vector(vectors: list) -> list:
+    """Average of the unit-normalised vectors (a single query for cosine search)."""
+    normalised = []
+    for v in vectors:
+        norm = sum(x * x for x in v) ** 0.5 or 1.0
+        normalised.append([x / norm for x in v])
+    return [sum(col) / len(normalised) for col in zip(*normalised)]
+
+
+def _reciprocal_rank_fusion(ranked_lists: list) -> list:
+    """
+    Fuse ranked chunk lists (vector matches, BM25 hits) into one group ranking.
+
+    Each chunk adds 1 / (SEARCH_RRF_K + rank) to its group, counting at most
+    SEARCH_RRF_CHUNKS_PER_GROUP chunks per group and list, so a group ranks
+    high when it has strong chunks in several lists.  Ties keep first-seen
+    order.  Returns the group ids, best first.
+    """
+    scores: dict = {}
+    for rows in ranked_lists:
+        counted: dict = {}
+        for rank, row in enumerate(rows, start=1):
+            gid = row.get("group_id")
+            if not gid or counted.get(gid, 0) >= SEARCH_RRF_CHUNKS_PER_GROUP:
+                continue
+            counted[gid] = counted.get(gid, 0) + 1
+            scores[gid] = scores.get(gid, 0.0) + 1.0 / (SEARCH_RRF_K + rank)
+    return sorted(scores, key=lambda gid: -scores[gid])
+
+
 # ── HyDE Semantic Search ──────────────────────────────────────────────────────
 
 @router.post("/search-documents")
@@ -511,8 +766,9 @@ async def search_documents(
     Multi-strategy document search.
 
     Accepts an optional ``mode`` field:
-      - ``"semantic"`` (default) – HyDE embedding search with text fallback.
-      - ``"text"``               – pure text / ILIKE search on chunks and titles.
+      - ``"semantic"`` (default) – HyDE vector search fused with BM25 (when
+                                   the text index is loaded), with text fallback.
+      - ``"text"``               – pure text search (BM25 or ILIKE) on chunks and titles.
 
     The semantic mode automatically falls back to text search when embedding
     fails (e.g. model unavailable or no embeddings stored yet).
@@ -523,84 +779,102 @@ async def search_documents(
 
     mode = (body.get("mode") or "semantic").strip().lower()
 
+    # Every Supabase/Gemini call below is blocking, so it is either offloaded
+    # to the threadpool or run on _search_pool – never on the event loop.
     user_id = current_user.get("id")
-    profile = _get_profile(user_id)
+    profile = await run_in_threadpool(_get_profile, user_id)
     university_id = profile.get("university_id")
 
     # ── Text-only mode ────────────────────────────────────────────────────────
     if mode == "text":
-        return _text_search(query, user_id, university_id)
+        return await run_in_threadpool(_text_search, query, user_id, university_id)
 
     # ── Semantic (HyDE) mode with automatic text fallback ─────────────────────
     print(f"[SEARCH] HyDE search initiated – query='{query}'")
 
-    # Step 1: Gemini → hypothetical phrases
-    hyde_prompt = (
-        "You are a search engine assistant for an academic document repository. "
-        "Given the following user query, generate 3 short hypothetical phrases or "
-        "sentences that would likely appear in a matching academic document. "
-        f"Separate each phrase with the delimiter  {HYDE_DELIMITER}  and output nothing else.\n\n"
-        f"Query: {query}"
-    )
+    # Step 1: Gemini → hypothetical phrases and their vectors (cached per query)
     try:
-        hyde_resp = gemini_client.models.generate_content(
-            model=GEN_MODEL, contents=hyde_prompt
-        )
-        raw_phrases = hyde_resp.text.strip()
-        print(f"[SEARCH] Gemini HyDE phrases: {raw_phrases}")
-        phrases = [p.strip() for p in raw_phrases.split(HYDE_DELIMITER) if p.strip()]
+        entries = await run_in_threadpool(_phrase_vectors, query)
     except Exception as exc:
-        print(f"[SEARCH] Gemini HyDE generation failed: {exc} – falling back to query")
-        phrases = [query]
+        print(f"[SEARCH] Embedding failed for phrases: {exc}")
+        entries = []
 
-    if not phrases:
-        phrases = [query]
+    vectors = [e["vector"] for e in entries]
+    use_text_index = text_index.ready()
 
-    # Step 2 & 3: Embed each phrase and collect matches
-    seen_group_ids: set = set()
-    results: list = []
-    embedding_failures = 0
-
-    for phrase in phrases:
-        print(f"[SEARCH] Embedding phrase: '{phrase[:80]}'")
+    # Only rank rows the caller can see (cached per user)
+    visible_ids = None
+    if vectors or use_text_index:
         try:
-            vector = _embed(phrase)
+            visible_ids = await run_in_threadpool(visible_group_ids, user_id, university_id)
         except Exception as exc:
-            print(f"[SEARCH] Embedding failed for phrase: {exc}")
-            embedding_failures += 1
-            continue
-
+            print(f"[SEARCH] Visible group lookup failed: {exc} – searching unfiltered")
+
+    # Step 2: Vector retrieval – one query for the mean of the phrase vectors,
+    # or one per phrase when SEARCH_VECTOR_FUSION=rrf.  All queries go to the
+    # in-process index at once when it is loaded, otherwise one RPC each, run
+    # concurrently.
+    queries = vectors
+    if vectors and SEARCH_VECTOR_FUSION == "mean":
+        queries = [_mean_vector(vectors)]
+
+    outcomes: list = []
+    if queries and vector_index.ready():
         try:
-            matches = supabase.rpc("match_embeddings", {
-                "query_vector": vector,
-                "match_count":  10,
-            }).execute()
-
-            for match in (matches.data or []):
-                gid = match.get("group_id")
-                if gid in seen_group_ids:
-                    continue
-                seen_group_ids.add(gid)
-
-                grp_resp = supabase.table("document_groups").select("*") \
-                    .eq("doc_group_id", gid).execute()
-                if not grp_resp.data:
-                    continue
-
-                r = _visible_group_result(
-                    grp_resp.data[0], user_id, university_id,
-                    similarity=match.get("similarity"),
-                )
-                if r:
-                    results.append(r)
+            outcomes = await run_in_threadpool(
+                vector_index.search, queries,
+                SEARCH_MATCH_GROUPS * SEARCH_OVERFETCH, visible_ids,
+            )
+        except Exception as exc:
+            print(f"[SEARCH] In-process vector index failed: {exc} – using match_embeddings")
+            outcomes = []
+
+    if queries and not outcomes:
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(SEARCH_PHRASE_CONCURRENCY)
 
+        filter_ids = sorted(visible_ids) if visible_ids is not None else None
+
+        async def _run_phrase(vector: list) -> list:
+            async with semaphore:
+                return await loop.run_in_executor(_search_pool, _match_vector, vector, filter_ids)
+
+        outcomes = await asyncio.gather(*(_run_phrase(v) for v in queries))
+
+    # Step 3: BM25 ranking of the raw query, when the text index is loaded
+    ranked_lists = list(outcomes)
+    if use_text_index:
+        try:
+            ranked_lists.append(await run_in_threadpool(
+                text_index.search, query, SEARCH_MATCH_GROUPS * SEARCH_OVERFETCH, visible_ids,
+            ))
         except Exception as exc:
-            print(f"[SEARCH] Vector search failed: {exc}")
+            print(f"[SEARCH] BM25 search failed: {exc}")
+
+    # Fuse all ranked lists into one group ranking
+    group_ids = _reciprocal_rank_fusion(ranked_lists)
+    similarities: dict = {}
+    for outcome in outcomes:
+        for match in outcome:
+            gid = match.get("group_id")
+            sim = match.get("similarity")
+            if sim is not None and sim > similarities.get(gid, float("-inf")):
+                similarities[gid] = sim
+
+    # Step 4: Resolve every matched group and its active version in bulk
+    results: list = []
+    if group_ids:
+        try:
+            results = await run_in_threadpool(
+                _hydrate_groups, group_ids, user_id, university_id, similarities=similarities
+            )
+        except Exception as exc:
+            print(f"[SEARCH] Result hydration failed: {exc}")
 
     # Automatic text fallback when all embeddings failed or no results found
     if not results:
         print("[SEARCH] Semantic search yielded no results – falling back to text search")
-        results = _text_search(query, user_id, university_id)
+        results = await run_in_threadpool(_text_search, query, user_id, university_id)
 
     print(f"[SEARCH] Returning {len(results)} results")
     return results
\ No newline at end of file
@@ -1,27 +1,151 @@
-from fastapi import APIRouter, Depends, HTTPException
-from config.supabase import supabase
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+import jwt
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from config.supabase import SUPABASE_KEY, supabase
 from config.auth import get_current_user
+from services import notification_bus
+from utils.cache import TTLCache
+from utils.http_cache import cache_headers, list_version, not_modified, parse_since, version_etag
 
 router = APIRouter()
 
+# Comment lines keep idle streams open through proxies; streams are closed
+# after NOTIFICATION_STREAM_MAX_AGE so the client reconnects with a fresh ticket.
+NOTIFICATION_STREAM_HEARTBEAT = int(os.getenv("NOTIFICATION_STREAM_HEARTBEAT", "15"))    # seconds
+NOTIFICATION_STREAM_MAX_AGE   = int(os.getenv("NOTIFICATION_STREAM_MAX_AGE", "300"))     # seconds
+# Seconds a stream ticket may wait before it is redeemed
+NOTIFICATION_STREAM_TICKET_TTL = int(os.getenv("NOTIFICATION_STREAM_TICKET_TTL", "30"))
+
+# Stream tickets are HS256 JWTs under a key derived from the service key, so
+# any API process can check a ticket another one issued.  Redeemed ticket ids
+# are remembered until the ticket would have expired anyway.
+_TICKET_AUDIENCE = "notification-stream"
+_TICKET_KEY = hashlib.sha256(b"notification-stream-ticket:" + SUPABASE_KEY.encode()).digest()
+_redeemed_tickets = TTLCache(maxsize=100_000, ttl=NOTIFICATION_STREAM_TICKET_TTL)
+_redeem_lock = threading.Lock()
+
 
 @router.get("/notifications")
-def get_notifications(current_user: dict = Depends(get_current_user)):
+def get_notifications(
+    request: Request,
+    since: str | None = Query(None),
+    current_user: dict = Depends(get_current_user),
+):
     """
     Return the 50 most recent notifications for the authenticated user,
-    unread ones first.
+    unread ones first.  With ``since`` only rows updated after it are
+    returned, oldest change first.  Answers 304 to a matching If-None-Match.
     """
     user_id = current_user.get("id")
-
-    resp = supabase.table("notifications") \
+    since = parse_since(since)
+
+    etag = version_etag(request, user_id, *list_version(
+        supabase.table("notifications")
+            .select("updated_at", count="exact")
+            .eq("user_id", user_id)
+    ))
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+
+    query = supabase.table("notifications") \
         .select("*") \
-        .eq("user_id", user_id) \
-        .order("is_read", desc=False) \
-        .order("created_at", desc=True) \
-        .limit(50) \
-        .execute()
+        .eq("user_id", user_id)
+    if since:
+        query = query.gt("updated_at", since).order("updated_at")
+    else:
+        query = query.order("is_read", desc=False).order("created_at", desc=True)
+    resp = query.limit(50).execute()
+
+    return JSONResponse(resp.data or [], headers=cache_headers(etag))
 
-    return resp.data or []
+
+@router.post("/notifications/stream-ticket")
+def create_stream_ticket(current_user: dict = Depends(get_current_user)):
+    """
+    Issue a single-use ticket that opens one /notifications/stream.
+
+    EventSource cannot send an Authorization header, and a bearer token in
+    the URL would be written to every access log on the way; the ticket is
+    only good for one stream within NOTIFICATION_STREAM_TICKET_TTL seconds.
+    """
+    claims = {
+        "sub": current_user.get("id"),
+        "aud": _TICKET_AUDIENCE,
+        "jti": uuid.uuid4().hex,
+        "exp": int(time.time()) + NOTIFICATION_STREAM_TICKET_TTL,
+    }
+    return {
+        "ticket":     jwt.encode(claims, _TICKET_KEY, algorithm="HS256"),
+        "expires_in": NOTIFICATION_STREAM_TICKET_TTL,
+    }
+
+
+def _redeem_ticket(ticket: str) -> str:
+    """The user id of a valid, unused stream ticket; marks it used."""
+    try:
+        claims = jwt.decode(ticket, _TICKET_KEY, algorithms=["HS256"], audience=_TICKET_AUDIENCE)
+    except jwt.PyJWTError:
+        raise HTTPException(status_code=401, detail="Invalid or expired stream ticket")
+    with _redeem_lock:
+        if _redeemed_tickets.get(claims["jti"]) is not None:
+            raise HTTPException(status_code=401, detail="Stream ticket already used")
+        _redeemed_tickets.set(claims["jti"], True)
+    return claims["sub"]
+
+
+@router.get("/notifications/stream")
+async def stream_notifications(request: Request, ticket: str = Query(...)):
+    """
+    Server-Sent Events stream of the user's new notifications.
+
+    Opened with a ticket from POST /notifications/stream-ticket.  Each new
+    row arrives as a ``notification`` event whose data is the row as JSON.
+    Clients load /notifications once on (re)connect and then rely on the
+    stream instead of polling.
+    """
+    user_id = _redeem_ticket(ticket)
+
+    subscription = notification_bus.subscribe(user_id)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + NOTIFICATION_STREAM_MAX_AGE
+
+    async def events():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(
+                        subscription.get(),
+                        timeout=min(NOTIFICATION_STREAM_HEARTBEAT, remaining),
+                    )
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                if row is None:
+                    break
+                yield f"event: notification\ndata: {json.dumps(row, default=str)}\n\n"
+        finally:
+            notification_bus.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.post("/notifications/{notification_id}/read")
@@ -0,0 +1,64 @@
+"""
+services/embedding_service.py
+-----------------------------
+Batched Gemini embedding calls shared by the background processor and the
+search routes.
+
+A single ``embed_content`` request can carry many texts, so callers hand over
+their whole list and this module splits it into batches bounded by both
+EMBED_BATCH_SIZE (texts per request) and EMBED_MAX_BATCH_CHARS (payload size).
+The number of HTTP round trips therefore grows with the number of batches,
+not the number of texts.
+"""
+
+import json
+import os
+from typing import Iterable, Iterator, List
+
+from services import gemini_scheduler
+from services.gemini_scheduler import BACKGROUND
+
+EMBED_MODEL           = "gemini-embedding-001"
+# Gemini accepts at most 100 texts per batch embedding request.
+EMBED_BATCH_SIZE      = int(os.getenv("EMBED_BATCH_SIZE", "100"))
+EMBED_MAX_BATCH_CHARS = int(os.getenv("EMBED_MAX_BATCH_CHARS", "100000"))
+
+
+def iter_batches(texts: Iterable[str], batch_size: int = EMBED_BATCH_SIZE,
+                 max_chars: int = EMBED_MAX_BATCH_CHARS) -> Iterator[List[str]]:
+    """
+    Yield consecutive slices of ``texts`` that respect both limits.
+    A single text longer than ``max_chars`` is sent on its own.  ``texts`` may
+    be a lazy iterator; each batch is yielded as soon as it is full.
+    """
+    batch: List[str] = []
+    batch_chars = 0
+    for text in texts:
+        if batch and (len(batch) >= batch_size or batch_chars + len(text) > max_chars):
+            yield batch
+            batch, batch_chars = [], 0
+        batch.append(text)
+        batch_chars += len(text)
+    if batch:
+        yield batch
+
+
+def parse_vector(value) -> List[float]:
+    # pgvector columns come back from PostgREST as '[0.1,0.2,…]' strings
+    return json.loads(value) if isinstance(value, str) else list(value)
+
+
+def embed_texts(texts: List[str], priority: int = BACKGROUND) -> List[List[float]]:
+    """
+    Return one embedding vector per input text, in input order.  Requests go
+    through the shared Gemini scheduler at ``priority``.
+    """
+    vectors: List[List[float]] = []
+    for batch in iter_batches(texts):
+        resp = gemini_scheduler.embed_content(EMBED_MODEL, batch, priority=priority)
+        if len(resp.embeddings) != len(batch):
+            raise RuntimeError(
+                f"embedding count mismatch: sent {len(batch)}, got {len(resp.embeddings)}"
+            )
+        vectors.extend(e.values for e in resp.embeddings)
+    return vectors
@@ -0,0 +1,201 @@
+"""
+services/gemini_scheduler.py
+----------------------------
+Central admission control for Gemini calls made by the API and the background
+processor.
+
+Every call goes through the scheduler of its model, which
+
+* admits it against a token bucket (GEMINI_*_RPM requests per minute),
+* bounds in-flight calls with an AIMD limit – +1 per window of successful
+  calls, halved whenever Gemini answers 429 / 5xx – between 1 and
+  GEMINI_MAX_CONCURRENCY,
+* retries 429 / 5xx responses with full-jitter exponential backoff, and
+* serves INTERACTIVE callers (search) before BACKGROUND ones (document
+  processing).  Background calls also leave one concurrency slot and a slice of
+  the bucket unused, so a bulk import cannot starve search.
+
+Calls block the calling thread; use them from worker threads or
+run_in_threadpool, never directly on the event loop.
+"""
+
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict
+
+from config.gemini import client as gemini_client
+
+INTERACTIVE = 0
+BACKGROUND  = 1
+
+GEMINI_GEN_RPM         = float(os.getenv("GEMINI_GEN_RPM", "1000"))
+GEMINI_EMBED_RPM       = float(os.getenv("GEMINI_EMBED_RPM", "1500"))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "16"))
+GEMINI_MAX_RETRIES     = int(os.getenv("GEMINI_MAX_RETRIES", "4"))
+RETRY_BASE_DELAY = 0.5          # seconds; doubled per attempt …
+RETRY_MAX_DELAY  = 8.0          # … up to this cap, then jittered
+# Share of the bucket and number of slots background calls may not use
+BACKGROUND_TOKEN_RESERVE = 0.1
+BACKGROUND_SLOT_RESERVE  = 1
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def _status_of(exc: Exception) -> int | None:
+    """HTTP status carried by a google-genai (or HTTP client) error, if any."""
+    for attr in ("code", "status_code"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(exc, "response", None)
+    value = getattr(response, "status_code", None)
+    return value if isinstance(value, int) else None
+
+
+class GeminiScheduler:
+    """Token bucket + AIMD concurrency limit + priority admission for one model."""
+
+    def __init__(self, model: str, rpm: float, max_concurrency: int):
+        self.model = model
+        self.rate = rpm / 60.0                      # tokens per second
+        self.capacity = max(1.0, self.rate)         # up to one second of burst
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = float(min(4, self.max_concurrency))
+
+        self.tokens = self.capacity
+        self.in_flight = 0
+        self.waiting = [0, 0]                       # per priority
+        self.calls = 0
+        self.retries = 0
+        self.throttled = 0
+        self._refilled_at = time.monotonic()
+        self._cond = threading.Condition()
+
+    # ── admission ────────────────────────────────────────────────────────────
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def _tokens_needed(self, priority: int) -> float:
+        if priority == INTERACTIVE:
+            return 1.0
+        return min(1 + self.capacity * BACKGROUND_TOKEN_RESERVE, self.capacity)
+
+    def _slots(self, priority: int) -> int:
+        if priority == INTERACTIVE:
+            return int(self.limit)
+        return max(1, int(self.limit) - BACKGROUND_SLOT_RESERVE)
+
+    def _acquire(self, priority: int):
+        with self._cond:
+            self.waiting[priority] += 1
+            try:
+                while True:
+                    self._refill(time.monotonic())
+                    needed = self._tokens_needed(priority)
+                    blocked = priority == BACKGROUND and self.waiting[INTERACTIVE] > 0
+                    if not blocked and self.in_flight < self._slots(priority) \
+                            and self.tokens >= needed:
+                        self.tokens -= 1
+                        self.in_flight += 1
+                        return
+                    # Completed calls notify; otherwise wake when enough tokens accrue
+                    timeout = None
+                    if self.tokens < needed:
+                        timeout = max(0.01, (needed - self.tokens) / self.rate)
+                    self._cond.wait(timeout)
+            finally:
+                self.waiting[priority] -= 1
+                if priority == INTERACTIVE:
+                    self._cond.notify_all()     # background callers may proceed now
+
+    def _release(self, throttled: bool):
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.throttled += 1
+                self.limit = max(1.0, self.limit / 2)
+            else:
+                self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    # ── public ───────────────────────────────────────────────────────────────
+
+    def call(self, fn: Callable, *args, priority: int = BACKGROUND, **kwargs) -> Any:
+        """Run ``fn(*args, **kwargs)`` under this model's limits, retrying 429/5xx."""
+        attempt = 0
+        while True:
+            self._acquire(priority)
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as exc:
+                retryable = _status_of(exc) in RETRYABLE_STATUS
+                self._release(throttled=retryable)
+                if not retryable or attempt >= GEMINI_MAX_RETRIES:
+                    raise
+                attempt += 1
+                with self._cond:
+                    self.retries += 1
+                delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+                print(
+                    f"[GEMINI] {self.model} returned {_status_of(exc)} – "
+                    f"retry {attempt}/{GEMINI_MAX_RETRIES} in {delay:.2f}s"
+                )
+                time.sleep(delay)
+                continue
+            self._release(throttled=False)
+            with self._cond:
+                self.calls += 1
+            return result
+
+    def stats(self) -> dict:
+        with self._cond:
+            self._refill(time.monotonic())
+            return {
+                "limit":       round(self.limit, 2),
+                "in_flight":   self.in_flight,
+                "waiting":     {"interactive": self.waiting[INTERACTIVE],
+                                "background":  self.waiting[BACKGROUND]},
+                "tokens":      round(self.tokens, 2),
+                "calls":       self.calls,
+                "retries":     self.retries,
+                "throttled":   self.throttled,
+            }
+
+
+_schedulers: Dict[str, GeminiScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def scheduler_for(model: str) -> GeminiScheduler:
+    """Return the process-wide scheduler for ``model``, creating it on first use."""
+    with _schedulers_lock:
+        sched = _schedulers.get(model)
+        if sched is None:
+            rpm = GEMINI_EMBED_RPM if "embedding" in model else GEMINI_GEN_RPM
+            sched = GeminiScheduler(model, rpm, GEMINI_MAX_CONCURRENCY)
+            _schedulers[model] = sched
+        return sched
+
+
+def generate_content(model: str, contents, priority: int = BACKGROUND, **kwargs):
+    return scheduler_for(model).call(
+        gemini_client.models.generate_content,
+        model=model, contents=contents, priority=priority, **kwargs,
+    )
+
+
+def embed_content(model: str, contents, priority: int = BACKGROUND, **kwargs):
+    return scheduler_for(model).call(
+        gemini_client.models.embed_content,
+        model=model, contents=contents, priority=priority, **kwargs,
+    )
+
+
+def gemini_scheduler_stats() -> dict:
+    with _schedulers_lock:
+        schedulers = list(_schedulers.values())
+    return {s.model: s.stats() for s in schedulers}
@@ -1,5 +1,6 @@
 from config.supabase import supabase
 from fastapi import HTTPException
+from services.profile_service import invalidate_profile
 
 
 def get_university_join_requests(university_id: str):
@@ -24,6 +25,7 @@ def approve_join_request(request_id: str):
         )
 
     supabase.table("profiles").update({"university_id": university_id}).eq("id", requester_id).execute()
+    invalidate_profile(requester_id)
 
     supabase.table("university_join_requests").update({"status": "approved"}).eq("request_id", request_id).execute()
 
@@ -0,0 +1,145 @@
+"""
+services/notification_bus.py
+----------------------------
+In-process publish/subscribe for new notification rows.
+
+Code that inserts into `notifications` calls ``publish`` with the stored row,
+and every open /notifications/stream connection of that user receives it.
+``publish`` is safe to call from any thread; each subscriber's queue lives on
+the event loop that serves its stream.
+
+Without DATABASE_URL, delivery only reaches streams held by the process that
+inserted the row.  With DATABASE_URL set (and psycopg installed) each API
+process instead LISTENs on `notifications_created`, fed by a trigger on the
+table, so rows written by a standalone worker or another API process reach
+every stream; local ``publish`` calls defer to it while its connection is
+up, and deliver directly again whenever it is down.
+
+A subscriber that falls NOTIFICATION_STREAM_QUEUE_SIZE rows behind is closed
+instead of silently losing rows; the client reconnects and reloads
+/notifications.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+try:
+    import psycopg
+except ImportError:                 # cross-process delivery is optional
+    psycopg = None
+
+NOTIFICATION_STREAM_QUEUE_SIZE = int(os.getenv("NOTIFICATION_STREAM_QUEUE_SIZE", "100"))
+DATABASE_URL   = os.getenv("DATABASE_URL")
+NOTIFY_CHANNEL = "notifications_created"
+
+_CLOSED = None      # queue sentinel: end the stream
+
+
+class Subscription:
+    """One open stream: the user it belongs to and its pending rows."""
+
+    def __init__(self, user_id: str, loop: asyncio.AbstractEventLoop):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=NOTIFICATION_STREAM_QUEUE_SIZE)
+
+    async def get(self) -> Optional[dict]:
+        """Wait for the next row; None means the stream must end."""
+        return await self.queue.get()
+
+    def _offer(self, row: Optional[dict]):
+        # Runs on self.loop
+        try:
+            self.queue.put_nowait(row)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(_CLOSED)
+
+
+_subscribers: dict = {}             # user_id → set of Subscription
+_lock = threading.Lock()
+_published = 0
+_listening = False                  # a LISTEN connection is currently up
+_listener_started = False
+
+
+def subscribe(user_id: str) -> Subscription:
+    """Register a stream for ``user_id``; call from the serving event loop."""
+    sub = Subscription(user_id, asyncio.get_running_loop())
+    with _lock:
+        _subscribers.setdefault(user_id, set()).add(sub)
+    return sub
+
+
+def unsubscribe(sub: Subscription):
+    with _lock:
+        subs = _subscribers.get(sub.user_id)
+        if subs is not None:
+            subs.discard(sub)
+            if not subs:
+                del _subscribers[sub.user_id]
+
+
+def publish(user_id: str, row: dict):
+    """Hand a stored notification row to the user's open streams."""
+    if _listening:
+        return          # the LISTEN thread delivers it, from whichever process
+    _deliver(user_id, row)
+
+
+def _deliver(user_id: str, row: dict):
+    global _published
+    with _lock:
+        subs = list(_subscribers.get(user_id, ()))
+        _published += 1
+    for sub in subs:
+        try:
+            sub.loop.call_soon_threadsafe(sub._offer, row)
+        except RuntimeError:
+            # The loop is closed; the stream is gone with it
+            unsubscribe(sub)
+
+
+def _listen_loop():
+    global _listening
+    while True:
+        try:
+            with psycopg.connect(DATABASE_URL, autocommit=True) as conn:
+                conn.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                _listening = True
+                print(f"[NOTIFY] Listening for '{NOTIFY_CHANNEL}' notifications")
+                for notify in conn.notifies():
+                    try:
+                        row = json.loads(notify.payload)
+                    except ValueError:
+                        continue
+                    _deliver(row.get("user_id"), row)
+        except Exception as exc:
+            print(f"[NOTIFY] WARNING – LISTEN connection lost: {exc}; retrying in 5s")
+        finally:
+            _listening = False          # publish() delivers locally until reconnected
+        time.sleep(5)
+
+
+def start_notification_listener():
+    """Deliver rows inserted by any process (no-op without DATABASE_URL/psycopg)."""
+    global _listener_started
+    if not DATABASE_URL or psycopg is None or _listener_started:
+        return
+    _listener_started = True
+    threading.Thread(target=_listen_loop, name="notification-listener", daemon=True).start()
+
+
+def notification_bus_stats() -> dict:
+    with _lock:
+        return {
+            "users":       len(_subscribers),
+            "subscribers": sum(len(s) for s in _subscribers.values()),
+            "published":   _published,
+            "listening":   _listening,
+        }
@@ -0,0 +1,180 @@
+"""
+services/notification_sink.py
+-----------------------------
+Write-behind buffer for `notifications` inserts.
+
+Callers queue payloads and return at once; a daemon thread writes them with
+one bulk insert when NOTIFICATION_FLUSH_SIZE rows are waiting or
+NOTIFICATION_FLUSH_INTERVAL seconds after the oldest was queued.  A
+`file_ready` payload replaces a still-buffered `file_processing` one for the
+same user and document, so a quickly processed upload produces one row.
+
+Stored rows are handed to services.notification_bus for the live streams.
+An insert that fails in transit (network error, 5xx) keeps its rows for the
+next flush, up to NOTIFICATION_FLUSH_MAX_ATTEMPTS times per row.  An insert
+the database rejects (constraint, type or schema error) is split in halves
+until the offending rows are isolated; those are logged and dropped so they
+cannot hold back the rest.  ``flush_notifications`` is registered with atexit
+and called from the API shutdown hook, so a clean exit writes everything
+still buffered.
+"""
+
+import atexit
+import os
+import threading
+import time
+
+from config.supabase import supabase
+from services import notification_bus
+
+NOTIFICATION_FLUSH_SIZE     = int(os.getenv("NOTIFICATION_FLUSH_SIZE", "50"))
+NOTIFICATION_FLUSH_INTERVAL = float(os.getenv("NOTIFICATION_FLUSH_INTERVAL", "2"))   # seconds
+# Rows kept while inserts keep failing; the oldest are dropped beyond this
+NOTIFICATION_BUFFER_LIMIT   = int(os.getenv("NOTIFICATION_BUFFER_LIMIT", "5000"))
+# Failed flushes a row may sit through before it is dropped
+NOTIFICATION_FLUSH_MAX_ATTEMPTS = int(os.getenv("NOTIFICATION_FLUSH_MAX_ATTEMPTS", "5"))
+
+# SQLSTATE classes and PostgREST error prefixes of requests that fail the same
+# way on every retry: data exceptions, constraint violations, syntax/undefined
+# objects, and PostgREST request/schema errors
+_REJECTED_CODES = ("22", "23", "42", "PGRST1", "PGRST2")
+_ATTEMPTS = "_flush_attempts"           # payload key, never inserted
+
+# Notification types superseded by a later type for the same document
+_SUPERSEDES = {"file_ready": "file_processing"}
+
+_buffer: list = []
+_first_queued: float | None = None
+_cond = threading.Condition()
+_flush_lock = threading.Lock()          # one bulk insert at a time
+_flusher: threading.Thread | None = None
+_stats = {"queued": 0, "coalesced": 0, "written": 0, "flushes": 0, "failed_flushes": 0,
+          "rejected": 0, "dropped": 0}
+
+
+def _ensure_flusher():
+    # Called with _cond held
+    global _flusher
+    if _flusher is None:
+        _flusher = threading.Thread(target=_flush_loop, name="notification-sink", daemon=True)
+        _flusher.start()
+
+
+def queue_notification(payload: dict):
+    """Buffer one `notifications` row for the next bulk insert."""
+    global _first_queued
+    with _cond:
+        _stats["queued"] += 1
+        replaced = _SUPERSEDES.get(payload.get("type"))
+        doc_id = payload.get("related_doc_id")
+        if replaced and doc_id:
+            for i, pending in enumerate(_buffer):
+                if (pending.get("type") == replaced
+                        and pending.get("related_doc_id") == doc_id
+                        and pending.get("user_id") == payload.get("user_id")):
+                    del _buffer[i]
+                    _stats["coalesced"] += 1
+                    break
+        _buffer.append(payload)
+        if _first_queued is None:
+            _first_queued = time.monotonic()
+        _ensure_flusher()
+        if len(_buffer) >= NOTIFICATION_FLUSH_SIZE:
+            _cond.notify()
+
+
+def _rejected(exc: Exception) -> bool:
+    """True when the database refused the request itself, not the transport."""
+    return str(getattr(exc, "code", None) or "").startswith(_REJECTED_CODES)
+
+
+def _insert(batch: list) -> tuple:
+    """
+    Insert ``batch``; returns (stored rows, payloads written, payloads to
+    retry).  A rejected insert is bisected; a rejected single row is dropped.
+    """
+    # A bulk insert needs the same keys in every row
+    columns = set().union(*batch) - {_ATTEMPTS}
+    rows = [{col: row.get(col) for col in columns} for row in batch]
+    try:
+        resp = supabase.table("notifications").insert(rows).execute()
+        return resp.data or [], len(batch), []
+    except Exception as exc:
+        if not _rejected(exc):
+            print(f"[NOTIFY] WARNING – insert of {len(batch)} notifications failed: {exc}")
+            return [], 0, batch
+        if len(batch) == 1:
+            print(f"[NOTIFY] WARNING – dropping notification rejected by the database: {exc} – {rows[0]}")
+            with _cond:
+                _stats["rejected"] += 1
+            return [], 0, []
+    mid = len(batch) // 2
+    stored, written, retry = _insert(batch[:mid])
+    more_stored, more_written, more_retry = _insert(batch[mid:])
+    return stored + more_stored, written + more_written, retry + more_retry
+
+
+def flush_notifications() -> int:
+    """Write every buffered row now; returns how many were stored."""
+    global _first_queued
+    with _flush_lock:
+        with _cond:
+            batch = _buffer[:]
+            _buffer.clear()
+            _first_queued = None
+        if not batch:
+            return 0
+        stored, written, retry = _insert(batch)
+
+        with _cond:
+            if written:
+                _stats["flushes"] += 1
+                _stats["written"] += written
+            if retry:
+                _stats["failed_flushes"] += 1
+                keep = []
+                for payload in retry:
+                    payload[_ATTEMPTS] = payload.get(_ATTEMPTS, 0) + 1
+                    if payload[_ATTEMPTS] < NOTIFICATION_FLUSH_MAX_ATTEMPTS:
+                        keep.append(payload)
+                given_up = len(retry) - len(keep)
+                if given_up:
+                    print(f"[NOTIFY] WARNING – dropping {given_up} notifications after "
+                          f"{NOTIFICATION_FLUSH_MAX_ATTEMPTS} failed flushes")
+                    _stats["dropped"] += given_up
+                _buffer[:0] = keep
+                overflow = len(_buffer) - NOTIFICATION_BUFFER_LIMIT
+                if overflow > 0:
+                    del _buffer[:overflow]
+                    _stats["dropped"] += overflow
+                if _buffer and _first_queued is None:
+                    _first_queued = time.monotonic()
+    for row in stored:
+        notification_bus.publish(row["user_id"], row)
+    return written
+
+
+def _flush_loop():
+    while True:
+        with _cond:
+            while True:
+                if len(_buffer) >= NOTIFICATION_FLUSH_SIZE:
+                    break
+                if _first_queued is None:
+                    _cond.wait()
+                    continue
+                remaining = _first_queued + NOTIFICATION_FLUSH_INTERVAL - time.monotonic()
+                if remaining <= 0:
+                    break
+                _cond.wait(remaining)
+        if not flush_notifications() and _buffer:
+            # Failed insert: the rows are back in the buffer, wait before retrying
+            time.sleep(NOTIFICATION_FLUSH_INTERVAL)
+
+
+def notification_sink_stats() -> dict:
+    with _cond:
+        return {**_stats, "buffered": len(_buffer)}
+
+
+atexit.register(flush_notifications)
@@ -0,0 +1,40 @@
+"""
+services/profile_service.py
+---------------------------
+In-process cache for ``profiles`` rows.
+
+Almost every route reads the caller's profile (role, university_id) before
+doing any real work.  Rows are cached for PROFILE_CACHE_TTL seconds; any code
+path that updates a profile must call ``invalidate_profile`` so this process
+never serves its own stale write.
+"""
+
+import os
+
+from config.supabase import supabase
+from utils.cache import TTLCache
+
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "5000"))
+PROFILE_CACHE_TTL  = int(os.getenv("PROFILE_CACHE_TTL", "60"))      # seconds
+
+_profile_cache = TTLCache(maxsize=PROFILE_CACHE_SIZE, ttl=PROFILE_CACHE_TTL)
+
+
+def get_profile(user_id: str) -> dict | None:
+    """Return the profile row for ``user_id`` or None if it does not exist."""
+    profile = _profile_cache.get(user_id)
+    if profile is None:
+        resp = supabase.table("profiles").select("*").eq("id", user_id).execute()
+        if not resp.data:
+            return None
+        profile = resp.data[0]
+        _profile_cache.set(user_id, profile)
+    return dict(profile)
+
+
+def invalidate_profile(user_id: str):
+    _profile_cache.pop(user_id)
+
+
+def profile_cache_stats() -> dict:
+    return _profile_cache.stats()
@@ -0,0 +1,120 @@
+"""
+services/search_cache.py
+------------------------
+Cache of HyDE phrases and their embedding vectors, keyed by normalised query
+and the generation/embedding models that produced them.
+
+Lookups go through an in-process LRU/TTL cache first and, when
+SEARCH_CACHE_PATH is set, a SQLite file that survives restarts.  Concurrent
+misses for the same key share a single Gemini computation.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, List, Tuple
+
+from utils.cache import SingleFlight, TTLCache
+
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1000"))
+SEARCH_CACHE_TTL  = int(os.getenv("SEARCH_CACHE_TTL", "86400"))     # seconds
+SEARCH_CACHE_PATH = os.getenv("SEARCH_CACHE_PATH")                  # optional SQLite file
+
+_memory = TTLCache(maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
+_flight = SingleFlight()
+_disk_lock = threading.Lock()
+_disk_hits = 0
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(SEARCH_CACHE_PATH, timeout=5)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS query_cache ("
+        " cache_key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+    )
+    return conn
+
+
+def _disk_get(key: str):
+    global _disk_hits
+    with _disk_lock:
+        conn = _connect()
+        try:
+            row = conn.execute(
+                "SELECT value, expires_at FROM query_cache WHERE cache_key = ?", (key,)
+            ).fetchone()
+        finally:
+            conn.close()
+    if not row or row[1] <= time.time():
+        return None
+    _disk_hits += 1
+    return json.loads(row[0]), row[1] - time.time()
+
+
+def _disk_set(key: str, value):
+    with _disk_lock:
+        conn = _connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM query_cache WHERE expires_at <= ?", (time.time(),))
+                conn.execute(
+                    "INSERT OR REPLACE INTO query_cache (cache_key, value, expires_at) "
+                    "VALUES (?, ?, ?)",
+                    (key, json.dumps(value), time.time() + SEARCH_CACHE_TTL),
+                )
+        finally:
+            conn.close()
+
+
+def get_or_compute(query: str, gen_model: str, embed_model: str,
+                   compute: Callable[[str], Tuple[List[dict], bool]]) -> List[dict]:
+    """
+    Return the cached ``[{"phrase", "vector"}, …]`` entries for ``query``.
+
+    On a miss ``compute(query)`` runs once per key across concurrent callers
+    and returns ``(entries, cacheable)``; degraded results (e.g. HyDE fell
+    back to the raw query) should pass ``cacheable=False``.
+    """
+    key = f"{gen_model}|{embed_model}|{normalize_query(query)}"
+    entries = _memory.get(key)
+    if entries is not None:
+        return entries
+
+    def _load():
+        if SEARCH_CACHE_PATH:
+            try:
+                stored = _disk_get(key)
+            except Exception as exc:
+                print(f"[SEARCH] WARNING – query cache read failed: {exc}")
+                stored = None
+            if stored:
+                value, ttl = stored
+                _memory.set(key, value, ttl=ttl)
+                return value
+
+        value, cacheable = compute(query)
+        if cacheable:
+            _memory.set(key, value)
+            if SEARCH_CACHE_PATH:
+                try:
+                    _disk_set(key, value)
+                except Exception as exc:
+                    print(f"[SEARCH] WARNING – query cache write failed: {exc}")
+        return value
+
+    return _flight.do(key, _load)
+
+
+def search_cache_stats() -> dict:
+    return {
+        **_memory.stats(),
+        "disk_hits":            _disk_hits,
+        "single_flight_shared": _flight.shared,
+        "persistent":           bool(SEARCH_CACHE_PATH),
+    }
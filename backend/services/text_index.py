@@ -0,0 +1,296 @@
+"""
+services/text_index.py
+----------------------
+Optional in-process BM25 inverted index over `document_chunks.text_content`.
+
+Text search used to run ``ILIKE '%query%'`` against the chunk table, and a
+leading wildcard means Postgres scans every chunk on every search.  With
+TEXT_INDEX_ENABLED=1 the chunks are tokenised into an inverted index (term →
+{chunk: term frequency}), and a query only touches the postings of its own
+terms, ranked with Okapi BM25.
+
+Loading, incremental updates and readiness work like services/vector_index:
+a background delta sync by `created_at` that re-reads an overlap window, plus
+add_chunks() from the processor after each stored batch, with rows keyed by
+chunk_id so a chunk seen twice is indexed once, and a periodic sweep that
+drops chunks of deleted documents.  Until the first load completes, ready()
+is False and _text_search keeps using ILIKE.
+"""
+
+import heapq
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Collection, Iterable, List, Optional
+
+from config.supabase import supabase
+
+TEXT_INDEX_ENABLED = os.getenv("TEXT_INDEX_ENABLED", "0") == "1"
+TEXT_INDEX_SYNC_INTERVAL = int(os.getenv("TEXT_INDEX_SYNC_INTERVAL", "60"))     # seconds
+TEXT_INDEX_SYNC_OVERLAP  = int(os.getenv("TEXT_INDEX_SYNC_OVERLAP", "60"))      # seconds
+TEXT_INDEX_RECONCILE_INTERVAL = int(os.getenv("TEXT_INDEX_RECONCILE_INTERVAL", "900"))  # seconds
+LOAD_PAGE_SIZE = 1000
+LOOKUP_PAGE_SIZE = 200      # document ids per reconcile lookup (URL length)
+BM25_K1 = 1.2
+BM25_B  = 0.75
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall((text or "").lower()) if len(t) > 1 or t.isdigit()]
+
+
+class BM25Index:
+    """
+    Inverted index of chunk texts with group metadata.  Rows are keyed by
+    chunk_id: re-adding a chunk with the same text is a no-op, with new text
+    it replaces the postings in place.  Rows freed by remove_documents() are
+    reused.  Thread-safe behind a single lock.
+    """
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self._postings: dict = {}            # term → {row: term frequency}
+        self._doc_len: List[int] = []
+        self._doc_terms: List[tuple] = []    # distinct terms per row, for removal
+        self._chunk_ids: List[str] = []
+        self._document_ids: List[str] = []
+        self._group_ids: List[Optional[str]] = []
+        self._text_hashes: List[Optional[int]] = []
+        self._row_by_chunk: dict = {}
+        self._free_rows: List[int] = []      # rows of removed chunks, for reuse
+        self._total_len = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._row_by_chunk)
+
+    def _remove(self, row: int):
+        for term in self._doc_terms[row]:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(row, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_len -= self._doc_len[row]
+        self._doc_len[row] = 0
+        self._doc_terms[row] = ()
+
+    def add(self, rows: Iterable[dict]):
+        """Add rows with chunk_id, document_id, group_id and text_content."""
+        # The last row wins when a batch repeats a chunk
+        rows = list({r["chunk_id"]: r for r in rows}.values())
+        with self._lock:
+            rows = self._pending(rows)        # unchanged chunks: sync overlap, processor
+        prepared = [(r, Counter(tokenize(r.get("text_content")))) for r in rows]
+        with self._lock:
+            for row, counts in prepared:
+                idx = self._row_by_chunk.get(row["chunk_id"])
+                if idx is not None:
+                    self._remove(idx)
+                elif self._free_rows:
+                    idx = self._free_rows.pop()
+                else:
+                    idx = len(self._chunk_ids)
+                    self._chunk_ids.append(None)
+                    self._document_ids.append(None)
+                    self._group_ids.append(None)
+                    self._text_hashes.append(None)
+                    self._doc_len.append(0)
+                    self._doc_terms.append(())
+                self._chunk_ids[idx] = row["chunk_id"]
+                self._document_ids[idx] = row.get("document_id")
+                self._group_ids[idx] = row.get("group_id")
+                self._text_hashes[idx] = hash(row.get("text_content") or "")
+                self._row_by_chunk[row["chunk_id"]] = idx
+                length = sum(counts.values())
+                self._doc_len[idx] = length
+                self._doc_terms[idx] = tuple(counts)
+                self._total_len += length
+                for term, tf in counts.items():
+                    self._postings.setdefault(term, {})[idx] = tf
+
+    def _pending(self, rows: List[dict]) -> List[dict]:
+        # Called with _lock held: rows whose chunk is new or whose text changed
+        pending = []
+        for row in rows:
+            old = self._row_by_chunk.get(row["chunk_id"])
+            if old is None or self._text_hashes[old] != hash(row.get("text_content") or ""):
+                pending.append(row)
+        return pending
+
+    def remove_documents(self, document_ids: Collection[str]) -> int:
+        """Drop every chunk of ``document_ids``; returns how many were dropped."""
+        document_ids = set(document_ids)
+        with self._lock:
+            dropped = [cid for cid, row in self._row_by_chunk.items()
+                       if self._document_ids[row] in document_ids]
+            for cid in dropped:
+                row = self._row_by_chunk.pop(cid)
+                self._remove(row)
+                self._chunk_ids[row] = self._document_ids[row] = self._group_ids[row] = None
+                self._text_hashes[row] = None
+                self._free_rows.append(row)
+        return len(dropped)
+
+    def document_ids(self) -> set:
+        """Documents with at least one chunk in the index."""
+        with self._lock:
+            return {self._document_ids[row] for row in self._row_by_chunk.values()}
+
+    def search(self, query: str, k: int = 50,
+               group_ids: Optional[Collection[str]] = None) -> List[dict]:
+        """
+        Return up to ``k`` chunks ranked by BM25 score for ``query``, as dicts
+        with chunk_id, document_id, group_id and score.  With ``group_ids``
+        only chunks of those groups are scored.
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            n = len(self._row_by_chunk)
+            if not terms or n == 0:
+                return []
+            avg_len = self._total_len / n or 1.0
+            scores: dict = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for row, tf in postings.items():
+                    if group_ids is not None and self._group_ids[row] not in group_ids:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_len[row] / avg_len)
+                    scores[row] = scores.get(row, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+            best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            return [
+                {
+                    "chunk_id":    self._chunk_ids[row],
+                    "document_id": self._document_ids[row],
+                    "group_id":    self._group_ids[row],
+                    "score":       score,
+                }
+                for row, score in best
+            ]
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Process-wide index
+# ──────────────────────────────────────────────────────────────────────────────
+
+_index: Optional[BM25Index] = BM25Index() if TEXT_INDEX_ENABLED else None
+_ready = threading.Event()
+_watermark: Optional[str] = None        # created_at of the newest synced chunk
+_reconciled = 0.0                        # monotonic time of the last reconcile()
+# Set by start_text_index(); a standalone worker never serves searches, so
+# add_chunks() does not fill an index there.
+_started = False
+
+
+def ready() -> bool:
+    return _index is not None and _ready.is_set()
+
+
+def sync() -> int:
+    """
+    Index every chunk created since the last sync, re-reading an overlap
+    window before it; returns rows read.
+    """
+    global _watermark
+    since = None
+    if _watermark:
+        since = (datetime.fromisoformat(_watermark.replace("Z", "+00:00"))
+                 - timedelta(seconds=TEXT_INDEX_SYNC_OVERLAP)).isoformat()
+    loaded = 0
+    newest = _watermark
+    offset = 0
+    while True:
+        query = supabase.table("document_chunks") \
+            .select("chunk_id, document_id, text_content, created_at, documents!inner(group_id)")
+        if since:
+            query = query.gte("created_at", since)
+        resp = query.order("created_at").order("chunk_id") \
+            .range(offset, offset + LOAD_PAGE_SIZE - 1) \
+            .execute()
+        rows = resp.data or []
+        for row in rows:
+            row["group_id"] = (row.get("documents") or {}).get("group_id")
+        _index.add(rows)
+        loaded += len(rows)
+        if rows:
+            newest = max(newest or "", rows[-1]["created_at"])
+        if len(rows) < LOAD_PAGE_SIZE:
+            break
+        offset += LOAD_PAGE_SIZE
+    _watermark = newest
+    return loaded
+
+
+def reconcile() -> int:
+    """Drop the chunks of documents that no longer exist; returns chunks dropped."""
+    indexed = list(_index.document_ids())
+    missing = set()
+    for start in range(0, len(indexed), LOOKUP_PAGE_SIZE):
+        page = indexed[start:start + LOOKUP_PAGE_SIZE]
+        resp = supabase.table("documents") \
+            .select("document_id") \
+            .in_("document_id", page) \
+            .execute()
+        missing.update(set(page) - {r["document_id"] for r in resp.data or []})
+    if not missing:
+        return 0
+    dropped = _index.remove_documents(missing)
+    print(f"[TEXT_INDEX] Dropped {dropped} chunks of {len(missing)} deleted documents")
+    return dropped
+
+
+def _sync_loop():
+    global _reconciled
+    while True:
+        try:
+            started = time.perf_counter()
+            sync()
+            if not _ready.is_set():
+                print(
+                    f"[TEXT_INDEX] Indexed {len(_index)} chunks "
+                    f"in {time.perf_counter() - started:.1f}s"
+                )
+                _ready.set()
+                _reconciled = time.monotonic()
+            elif time.monotonic() - _reconciled >= TEXT_INDEX_RECONCILE_INTERVAL:
+                reconcile()
+                _reconciled = time.monotonic()
+        except Exception as exc:
+            print(f"[TEXT_INDEX] WARNING – sync failed: {exc}")
+        time.sleep(TEXT_INDEX_SYNC_INTERVAL)
+
+
+def start_text_index():
+    """Begin loading the index in a daemon thread (no-op unless enabled)."""
+    global _started
+    if _index is None or _started:
+        return
+    _started = True
+    threading.Thread(target=_sync_loop, name="text-index", daemon=True).start()
+
+
+def add_chunks(rows: List[dict], group_id: Optional[str]):
+    """Index freshly stored chunk rows (no-op unless started in this process)."""
+    if not _started:
+        return
+    try:
+        _index.add({**row, "group_id": group_id} for row in rows)
+    except Exception as exc:
+        print(f"[TEXT_INDEX] WARNING – could not index new chunks: {exc}")
+
+
+def search(query: str, k: int = 50,
+           group_ids: Optional[Collection[str]] = None) -> List[dict]:
+    return _index.search(query, k, group_ids=group_ids)
@@ -1,5 +1,6 @@
 from config.supabase import supabase
 from fastapi import HTTPException
+from services.profile_service import invalidate_profile
 
 
 def create_university_and_assign_admin(university_name: str, user_id: str):
@@ -10,6 +11,7 @@ def create_university_and_assign_admin(university_name: str, user_id: str):
     university_id = uni_resp.data[0]["university_id"]
 
     supabase.table("profiles").update({"role": "admin", "university_id": university_id}).eq("id", user_id).execute()
+    invalidate_profile(user_id)
 
     return {"message": "You are now admin"}
 
@@ -63,6 +65,7 @@ def become_faculty(user_id: str):
         )
 
     supabase.table("profiles").update({"role": "faculty", "university_id": None}).eq("id", user_id).execute()
+    invalidate_profile(user_id)
 
     return {"message": "You are now faculty"}
 
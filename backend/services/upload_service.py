@@ -0,0 +1,61 @@
+"""
+services/upload_service.py
+--------------------------
+Bounded-memory handling of uploaded files.
+
+Uploads are copied to a named temporary file in UPLOAD_CHUNK_SIZE pieces while
+their SHA-256 and byte count are computed, then streamed from disk to Supabase
+Storage.  Peak memory per upload is one chunk regardless of file size, and
+files larger than MAX_UPLOAD_BYTES are rejected with 413 before anything is
+written to storage or the database.
+"""
+
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Iterator, NamedTuple
+
+from fastapi import HTTPException, UploadFile
+
+from config.supabase import supabase
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))          # 1 MiB
+MAX_UPLOAD_BYTES  = int(os.getenv("MAX_UPLOAD_BYTES", str(250 * 1024 * 1024)))     # 250 MiB
+
+
+class StagedUpload(NamedTuple):
+    path: str
+    size: int
+    sha256: str
+
+
+@contextmanager
+def staged_upload(file: UploadFile) -> Iterator[StagedUpload]:
+    """Spool ``file`` to disk chunk by chunk; the temp file is removed on exit."""
+    digest = hashlib.sha256()
+    size = 0
+    tmp = tempfile.NamedTemporaryFile(prefix="scholarsync-upload-", delete=False)
+    try:
+        with tmp:
+            while True:
+                chunk = file.file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File exceeds the {MAX_UPLOAD_BYTES // (1024 * 1024)} MB upload limit",
+                    )
+                digest.update(chunk)
+                tmp.write(chunk)
+        yield StagedUpload(tmp.name, size, digest.hexdigest())
+    finally:
+        os.unlink(tmp.name)
+
+
+def upload_to_storage(bucket: str, path: str, staged: StagedUpload):
+    """Stream a staged upload from disk to Supabase Storage."""
+    with open(staged.path, "rb") as fh:
+        supabase.storage.from_(bucket).upload(path, fh)
@@ -0,0 +1,495 @@
+"""
+services/vector_index.py
+------------------------
+Optional in-process approximate-nearest-neighbour index over the `embeddings`
+table, used by semantic search instead of one `match_embeddings` RPC per HyDE
+phrase.
+
+Enable with VECTOR_INDEX_ENABLED=1 (requires numpy).  Vectors are held as a
+unit-normalised float32 matrix, so cosine similarity is a dot product.  Once
+the index holds VECTOR_INDEX_TRAIN_MIN vectors it is partitioned IVF-style:
+k-means centroids split it into lists, and a query only scores the rows in its
+VECTOR_INDEX_NPROBE nearest lists.  Smaller indexes are searched exactly.
+
+The index is filled in the background at startup, then kept current by the
+processor (add_embeddings after each stored batch) and by a periodic delta
+sync, which also covers a processor running in another process.  The delta
+re-reads VECTOR_INDEX_SYNC_OVERLAP seconds before the newest row it has seen,
+so rows that commit late with an earlier `created_at` are not missed; rows
+are keyed by their stable chunk_id, so re-read rows are skipped.  Every
+VECTOR_INDEX_RECONCILE_INTERVAL seconds rows of deleted documents are dropped.
+Replaced and dropped rows are compacted away when the index is rebuilt, which
+happens when it doubles or a quarter of it is dead.  Rebuilding trains and
+assigns on a snapshot outside the lock, so searches keep running.  Until the
+first load completes, ready() is False and search keeps using the RPC.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Collection, Iterable, List, Optional
+
+try:
+    import numpy as np
+except ImportError:                 # the index is optional
+    np = None
+
+from config.supabase import supabase
+from services.embedding_service import EMBED_MODEL, parse_vector
+
+VECTOR_INDEX_ENABLED = os.getenv("VECTOR_INDEX_ENABLED", "0") == "1"
+# Probed lists per query; more lists → better recall, slower queries
+VECTOR_INDEX_NPROBE = int(os.getenv("VECTOR_INDEX_NPROBE", "8"))
+# Below this many vectors every query is answered exactly
+VECTOR_INDEX_TRAIN_MIN = int(os.getenv("VECTOR_INDEX_TRAIN_MIN", "5000"))
+VECTOR_INDEX_SYNC_INTERVAL = int(os.getenv("VECTOR_INDEX_SYNC_INTERVAL", "60"))   # seconds
+VECTOR_INDEX_SYNC_OVERLAP  = int(os.getenv("VECTOR_INDEX_SYNC_OVERLAP", "60"))    # seconds
+VECTOR_INDEX_RECONCILE_INTERVAL = int(os.getenv("VECTOR_INDEX_RECONCILE_INTERVAL", "900"))  # seconds
+LOAD_PAGE_SIZE = 1000
+LOOKUP_PAGE_SIZE = 200      # document ids per reconcile lookup (URL length)
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE = 50_000      # vectors used to train the centroids
+ASSIGN_BLOCK  = 16_384      # rows scored against the centroids at a time
+COMPACT_MIN_DEAD = 1024     # dead rows tolerated before a rebuild, at minimum
+
+
+def _normalise(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _nearest(vectors, centroids):
+    """Index of the nearest centroid for every row, scored in blocks."""
+    nearest = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), ASSIGN_BLOCK):
+        block = vectors[start:start + ASSIGN_BLOCK]
+        nearest[start:start + ASSIGN_BLOCK] = np.argmax(block @ centroids.T, axis=1)
+    return nearest
+
+
+def _train_centroids(vectors):
+    """Spherical k-means on a sample of ``vectors``; one list per sqrt(n) rows."""
+    nlist = max(1, int(np.sqrt(len(vectors))))
+    rng = np.random.default_rng(0)
+    sample = vectors[rng.choice(len(vectors), size=min(len(vectors), KMEANS_SAMPLE), replace=False)]
+    centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        nearest = np.argmax(sample @ centroids.T, axis=1)
+        # Sum members per centroid; a centroid left empty keeps its position
+        sums = centroids.copy()
+        order = np.argsort(nearest, kind="stable")
+        members, starts = np.unique(nearest[order], return_index=True)
+        sums[members] = np.add.reduceat(sample[order], starts, axis=0)
+        centroids = _normalise(sums)
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted-file index over unit vectors with per-row chunk/document/group
+    metadata.  Rows are keyed by chunk_id: re-adding a chunk with the same
+    vector is a no-op, with a new vector it replaces the earlier row.
+    Thread-safe: writers and readers share one lock; searches hold it only
+    while they slice the arrays, and rebuilds only while they swap them.
+    """
+
+    def __init__(self, nprobe: int = VECTOR_INDEX_NPROBE,
+                 train_min: int = VECTOR_INDEX_TRAIN_MIN):
+        self.nprobe = nprobe
+        self.train_min = train_min
+        self.dim: Optional[int] = None
+        self._vectors = None                 # (capacity, dim) float32
+        self._valid = None                   # (capacity,) bool – False for replaced/removed rows
+        self._group_codes = None             # (capacity,) int32 – index into _group_code
+        self._group_code: dict = {}          # group_id → small int, for vectorised filters
+        self._size = 0
+        self._chunk_ids: List[str] = []
+        self._document_ids: List[str] = []
+        self._group_ids: List[str] = []
+        self._row_by_chunk: dict = {}        # chunk_id → its valid row
+        self._centroids = None               # (nlist, dim) float32
+        self._lists: List[list] = []         # row ids per centroid
+        self._list_arrays: List = []         # cached np arrays of _lists
+        self._trained_size = 0               # live rows at the last rebuild
+        self._lock = threading.RLock()
+        self._rebuild_lock = threading.Lock()   # one rebuild at a time
+
+    def __len__(self) -> int:
+        return len(self._row_by_chunk)
+
+    # ── writes ───────────────────────────────────────────────────────────────
+
+    def _grow(self, needed: int):
+        capacity = 0 if self._vectors is None else self._vectors.shape[0]
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, 2 * capacity, 1024)
+        vectors = np.zeros((new_capacity, self.dim), dtype=np.float32)
+        valid = np.zeros(new_capacity, dtype=bool)
+        group_codes = np.zeros(new_capacity, dtype=np.int32)
+        if self._vectors is not None:
+            vectors[:self._size] = self._vectors[:self._size]
+            valid[:self._size] = self._valid[:self._size]
+            group_codes[:self._size] = self._group_codes[:self._size]
+        self._vectors, self._valid, self._group_codes = vectors, valid, group_codes
+
+    def add(self, rows: Iterable[dict], retrain: bool = True):
+        """
+        Add rows shaped like `embeddings` rows (chunk_id, document_id,
+        group_id, vector).  With ``retrain=True`` a rebuild that has become
+        due is started on a background thread; with ``retrain=False`` it waits
+        for maybe_train() (bulk loads).
+        """
+        # The last row wins when a batch repeats a chunk
+        rows = list({r["chunk_id"]: r for r in rows if r.get("vector") is not None}.values())
+        if not rows:
+            return
+        matrix = _normalise(np.asarray([parse_vector(r["vector"]) for r in rows], dtype=np.float32))
+        with self._lock:
+            if self.dim is None:
+                self.dim = matrix.shape[1]
+            if matrix.shape[1] != self.dim:
+                raise ValueError(f"vector dimension {matrix.shape[1]} != index dimension {self.dim}")
+
+            fresh = []
+            for i, row in enumerate(rows):
+                old = self._row_by_chunk.get(row["chunk_id"])
+                if old is not None:
+                    if np.allclose(self._vectors[old], matrix[i], atol=1e-6):
+                        continue                  # already indexed (sync overlap, processor)
+                    self._valid[old] = False
+                fresh.append(i)
+
+            if fresh:
+                start = self._size
+                self._grow(start + len(fresh))
+                self._vectors[start:start + len(fresh)] = matrix[fresh]
+                self._valid[start:start + len(fresh)] = True
+                for offset, i in enumerate(fresh):
+                    row = rows[i]
+                    self._chunk_ids.append(row["chunk_id"])
+                    self._document_ids.append(row.get("document_id"))
+                    self._group_ids.append(row.get("group_id"))
+                    self._group_codes[start + offset] = self._group_code.setdefault(
+                        row.get("group_id"), len(self._group_code)
+                    )
+                    self._row_by_chunk[row["chunk_id"]] = start + offset
+                self._size += len(fresh)
+                if self._centroids is not None:
+                    self._assign(np.arange(start, self._size))
+
+            due = retrain and self._needs_rebuild()
+        if due and not self._rebuild_lock.locked():
+            threading.Thread(target=self.maybe_train, name="vector-index-train", daemon=True).start()
+
+    def remove_documents(self, document_ids: Collection[str]) -> int:
+        """Drop every row of ``document_ids``; returns how many were dropped."""
+        document_ids = set(document_ids)
+        with self._lock:
+            dropped = [cid for cid, row in self._row_by_chunk.items()
+                       if self._document_ids[row] in document_ids]
+            for cid in dropped:
+                self._valid[self._row_by_chunk.pop(cid)] = False
+        return len(dropped)
+
+    def document_ids(self) -> set:
+        """Documents with at least one row in the index."""
+        with self._lock:
+            return {self._document_ids[row] for row in self._row_by_chunk.values()}
+
+    def _needs_rebuild(self) -> bool:
+        # Called with _lock held
+        live = len(self._row_by_chunk)
+        dead = self._size - live
+        if live >= self.train_min and live >= 2 * self._trained_size:
+            return True                           # first training, or doubled since
+        return dead >= max(live // 4, COMPACT_MIN_DEAD)
+
+    def maybe_train(self):
+        """
+        Rebuild once the index is big enough to train, each time it doubles,
+        and whenever a quarter of its rows are dead.
+        """
+        with self._rebuild_lock:
+            with self._lock:
+                if not self._needs_rebuild():
+                    return
+                # Rows below _size are never rewritten, only invalidated, so
+                # the current array can be read after the lock is released
+                size, vectors = self._size, self._vectors
+                live = np.flatnonzero(self._valid[:size])
+            self._rebuild(size, vectors, live)
+
+    def _assign(self, row_ids):
+        nearest = _nearest(self._vectors[row_ids], self._centroids)
+        for row, lst in zip(row_ids.tolist(), nearest.tolist()):
+            self._lists[lst].append(row)
+            self._list_arrays[lst] = None
+
+    def _rebuild(self, size: int, vectors, live):
+        """
+        Compact the snapshot ``live`` rows and, if there are enough, train
+        centroids and assign them – all without the lock.  Then, under the
+        lock, drop rows invalidated meanwhile, append rows added meanwhile
+        and swap the new arrays in.
+        """
+        started = time.perf_counter()
+        compact = vectors[live]
+        centroids = None
+        members = []
+        if len(live) >= self.train_min:
+            centroids = _train_centroids(compact)
+            nearest = _nearest(compact, centroids)
+            order = np.argsort(nearest, kind="stable")
+            bounds = np.searchsorted(nearest[order], np.arange(len(centroids) + 1))
+            members = [order[bounds[i]:bounds[i + 1]] for i in range(len(centroids))]
+
+        with self._lock:
+            still = self._valid[live]
+            added = np.arange(size, self._size)
+            added = added[self._valid[size:self._size]]
+            kept = live[still]
+            total = len(kept) + len(added)
+
+            new_vectors = np.zeros((max(2 * total, 1024), self.dim), dtype=np.float32)
+            new_vectors[:len(kept)] = compact[still]
+            new_vectors[len(kept):total] = self._vectors[added]
+            new_valid = np.zeros(len(new_vectors), dtype=bool)
+            new_valid[:total] = True
+            new_group_codes = np.zeros(len(new_vectors), dtype=np.int32)
+            rows = np.concatenate([kept, added])
+            new_group_codes[:total] = self._group_codes[rows]
+            rows = rows.tolist()
+
+            self._vectors, self._valid, self._group_codes = new_vectors, new_valid, new_group_codes
+            self._chunk_ids = [self._chunk_ids[r] for r in rows]
+            self._document_ids = [self._document_ids[r] for r in rows]
+            self._group_ids = [self._group_ids[r] for r in rows]
+            self._row_by_chunk = {cid: row for row, cid in enumerate(self._chunk_ids)}
+            self._size = total
+            self._centroids = centroids
+            if centroids is None:
+                self._lists, self._list_arrays = [], []
+            else:
+                # Snapshot positions → compacted positions, skipping dead rows
+                position = np.cumsum(still) - 1
+                arrays = [position[m[still[m]]] for m in members]
+                self._lists = [a.tolist() for a in arrays]
+                self._list_arrays = arrays
+                self._assign(np.arange(len(kept), total))
+            self._trained_size = total if centroids is not None else 0
+        print(
+            f"[VECTOR_INDEX] Rebuilt {len(self._lists)} lists over {total} vectors "
+            f"({size - len(live)} dead rows dropped) in {time.perf_counter() - started:.2f}s"
+        )
+
+    # ── reads ────────────────────────────────────────────────────────────────
+
+    def _list_rows(self, lst: int):
+        arr = self._list_arrays[lst]
+        if arr is None:
+            arr = np.asarray(self._lists[lst], dtype=np.int64)
+            self._list_arrays[lst] = arr
+        return arr
+
+    def search(self, queries: List[List[float]], k: int = 10, exact: bool = False,
+               group_ids: Optional[Collection[str]] = None) -> List[List[dict]]:
+        """
+        Return the ``k`` most similar rows for each query vector, best first,
+        as dicts with chunk_id, document_id, group_id and similarity.  All
+        queries are scored against the union of their candidate rows in one
+        matrix product.
+
+        When ``group_ids`` is given only rows of those groups are considered;
+        if the probed lists hold fewer than ``k`` such rows, the number of
+        probed lists is doubled until they do or every list is probed.
+        """
+        if not queries:
+            return []
+        q = _normalise(np.asarray(queries, dtype=np.float32))
+        with self._lock:
+            if self._size == 0:
+                return [[] for _ in queries]
+            allowed = None
+            if group_ids is not None:
+                allowed = np.fromiter(
+                    (self._group_code[g] for g in group_ids if g in self._group_code),
+                    dtype=np.int32,
+                )
+                if len(allowed) == 0:
+                    return [[] for _ in queries]
+
+            if allowed is None and (exact or self._centroids is None):
+                # Score every row through a view instead of copying the matrix
+                candidates = np.arange(self._size)
+                matrix = self._vectors[:self._size]
+                invalid = ~self._valid[:self._size]
+            elif exact or self._centroids is None:
+                keep = self._valid[:self._size] & np.isin(self._group_codes[:self._size], allowed)
+                candidates = np.flatnonzero(keep)
+                matrix = self._vectors[candidates]
+                invalid = None
+            else:
+                nprobe = min(self.nprobe, len(self._lists))
+                centroid_scores = -(q @ self._centroids.T)
+                while True:
+                    probed = np.argpartition(centroid_scores, nprobe - 1, axis=1)[:, :nprobe]
+                    candidates = np.unique(np.concatenate(
+                        [self._list_rows(lst) for lst in np.unique(probed)]
+                    ))
+                    keep = self._valid[candidates]
+                    if allowed is not None:
+                        keep &= np.isin(self._group_codes[candidates], allowed)
+                    candidates = candidates[keep]
+                    if len(candidates) >= k or nprobe >= len(self._lists):
+                        break
+                    nprobe = min(2 * nprobe, len(self._lists))
+                matrix = self._vectors[candidates]
+                invalid = None
+            chunk_ids, document_ids, group_ids = self._chunk_ids, self._document_ids, self._group_ids
+
+        if len(candidates) == 0:
+            return [[] for _ in queries]
+        scores = q @ matrix.T                                  # (queries, candidates)
+        if invalid is not None and invalid.any():
+            scores[:, invalid] = -np.inf
+        top = min(k, len(candidates))
+        best = np.argpartition(-scores, top - 1, axis=1)[:, :top]
+        results = []
+        for qi in range(len(q)):
+            order = best[qi][np.argsort(-scores[qi, best[qi]])]
+            results.append([
+                {
+                    "chunk_id":    chunk_ids[candidates[j]],
+                    "document_id": document_ids[candidates[j]],
+                    "group_id":    group_ids[candidates[j]],
+                    "similarity":  float(scores[qi, j]),
+                }
+                for j in order
+                if np.isfinite(scores[qi, j])
+            ])
+        return results
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Process-wide index
+# ──────────────────────────────────────────────────────────────────────────────
+
+_index: Optional[IVFIndex] = IVFIndex() if VECTOR_INDEX_ENABLED and np is not None else None
+_ready = threading.Event()
+_watermark: Optional[str] = None        # created_at of the newest synced row
+_reconciled = 0.0                        # monotonic time of the last reconcile()
+# Set by start_vector_index(); a standalone worker never serves searches, so
+# add_embeddings() does not fill an index there.
+_started = False
+
+
+def enabled() -> bool:
+    return _index is not None
+
+
+def ready() -> bool:
+    return _index is not None and _ready.is_set()
+
+
+def sync() -> int:
+    """
+    Load every embedding created since the last sync, re-reading an overlap
+    window before it; returns rows read.
+    """
+    global _watermark
+    since = None
+    if _watermark:
+        since = (datetime.fromisoformat(_watermark.replace("Z", "+00:00"))
+                 - timedelta(seconds=VECTOR_INDEX_SYNC_OVERLAP)).isoformat()
+    loaded = 0
+    newest = _watermark
+    offset = 0
+    while True:
+        query = supabase.table("embeddings") \
+            .select("chunk_id, document_id, group_id, vector, created_at") \
+            .eq("model_name", EMBED_MODEL)
+        if since:
+            query = query.gte("created_at", since)
+        resp = query.order("created_at").order("chunk_id") \
+            .range(offset, offset + LOAD_PAGE_SIZE - 1) \
+            .execute()
+        rows = resp.data or []
+        _index.add(rows, retrain=False)
+        loaded += len(rows)
+        if rows:
+            newest = max(newest or "", rows[-1]["created_at"])
+        if len(rows) < LOAD_PAGE_SIZE:
+            break
+        offset += LOAD_PAGE_SIZE
+    _index.maybe_train()
+    _watermark = newest
+    return loaded
+
+
+def reconcile() -> int:
+    """Drop the rows of documents that no longer exist; returns rows dropped."""
+    indexed = list(_index.document_ids())
+    missing = set()
+    for start in range(0, len(indexed), LOOKUP_PAGE_SIZE):
+        page = indexed[start:start + LOOKUP_PAGE_SIZE]
+        resp = supabase.table("documents") \
+            .select("document_id") \
+            .in_("document_id", page) \
+            .execute()
+        missing.update(set(page) - {r["document_id"] for r in resp.data or []})
+    if not missing:
+        return 0
+    dropped = _index.remove_documents(missing)
+    _index.maybe_train()
+    print(f"[VECTOR_INDEX] Dropped {dropped} vectors of {len(missing)} deleted documents")
+    return dropped
+
+
+def _sync_loop():
+    global _reconciled
+    while True:
+        try:
+            started = time.perf_counter()
+            sync()
+            if not _ready.is_set():
+                print(
+                    f"[VECTOR_INDEX] Loaded {len(_index)} vectors "
+                    f"in {time.perf_counter() - started:.1f}s"
+                )
+                _ready.set()
+                _reconciled = time.monotonic()
+            elif time.monotonic() - _reconciled >= VECTOR_INDEX_RECONCILE_INTERVAL:
+                reconcile()
+                _reconciled = time.monotonic()
+        except Exception as exc:
+            print(f"[VECTOR_INDEX] WARNING – sync failed: {exc}")
+        time.sleep(VECTOR_INDEX_SYNC_INTERVAL)
+
+
+def start_vector_index():
+    """Begin loading the index in a daemon thread (no-op unless enabled)."""
+    global _started
+    if VECTOR_INDEX_ENABLED and np is None:
+        print("[VECTOR_INDEX] VECTOR_INDEX_ENABLED is set but numpy is not installed – disabled")
+    if _index is None or _started:
+        return
+    _started = True
+    threading.Thread(target=_sync_loop, name="vector-index", daemon=True).start()
+
+
+def add_embeddings(rows: List[dict]):
+    """Index freshly stored embedding rows (no-op unless started in this process)."""
+    if not _started:
+        return
+    try:
+        _index.add(rows)
+    except Exception as exc:
+        print(f"[VECTOR_INDEX] WARNING – could not index new vectors: {exc}")
+
+
+def search(vectors: List[List[float]], k: int = 10,
+           group_ids: Optional[Collection[str]] = None) -> List[List[dict]]:
+    return _index.search(vectors, k, group_ids=group_ids)
@@ -0,0 +1,59 @@
+"""
+services/visibility_service.py
+------------------------------
+In-process cache of the document-group ids each user may see.
+
+A group is visible when it is global, was created by the user, or belongs to
+the user's university – the same rule _visible_group_result applies.  Vector
+retrieval passes this set down as `filter_group_ids` so it only ranks rows the
+caller can see.  Sets are cached per (user, university) for
+VISIBLE_GROUPS_CACHE_TTL seconds; creating a group calls
+``invalidate_visible_groups`` so this process sees it immediately.
+"""
+
+import os
+
+from config.supabase import supabase
+from utils.cache import TTLCache
+
+VISIBLE_GROUPS_CACHE_SIZE = int(os.getenv("VISIBLE_GROUPS_CACHE_SIZE", "5000"))
+VISIBLE_GROUPS_CACHE_TTL  = int(os.getenv("VISIBLE_GROUPS_CACHE_TTL", "60"))    # seconds
+PAGE_SIZE = 1000            # PostgREST's default max rows per response
+
+_visible_cache = TTLCache(maxsize=VISIBLE_GROUPS_CACHE_SIZE, ttl=VISIBLE_GROUPS_CACHE_TTL)
+
+
+def visible_group_ids(user_id: str, university_id: str | None) -> frozenset:
+    """Return the ids of every document group ``user_id`` can see."""
+    key = (user_id, university_id)
+    ids = _visible_cache.get(key)
+    if ids is not None:
+        return ids
+
+    found = []
+    offset = 0
+    while True:
+        resp = supabase.table("document_groups") \
+            .select("doc_group_id") \
+            .or_(f"scope.eq.global,created_by.eq.{user_id},university_id.eq.{university_id}") \
+            .order("doc_group_id") \
+            .range(offset, offset + PAGE_SIZE - 1) \
+            .execute()
+        rows = resp.data or []
+        found.extend(r["doc_group_id"] for r in rows)
+        if len(rows) < PAGE_SIZE:
+            break
+        offset += PAGE_SIZE
+
+    ids = frozenset(found)
+    _visible_cache.set(key, ids)
+    return ids
+
+
+def invalidate_visible_groups():
+    """Drop every cached set; a new group can be visible to many users."""
+    _visible_cache.clear()
+
+
+def visible_groups_cache_stats() -> dict:
+    return _visible_cache.stats()
@@ -0,0 +1,118 @@
+"""
+utils/cache.py
+--------------
+Small thread-safe in-process caches shared by the config, routes and services
+modules.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Bounded LRU cache whose entries also expire after ``ttl`` seconds.
+
+    Reads refresh an entry's LRU position but not its expiry.  Once
+    ``maxsize`` entries are stored, the least recently used one is evicted.
+    Hit and miss counters are kept so callers can expose them.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, None)
+            return default if entry is None else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size":     len(self._data),
+                "maxsize":  self.maxsize,
+                "ttl":      self.ttl,
+                "hits":     self.hits,
+                "misses":   self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls for the same key into one execution.
+
+    The first caller for a key runs ``fn``; callers arriving while it is still
+    running block until it finishes and receive the same result (or the same
+    exception).  Nothing is remembered once the call completes – pair this
+    with a cache for that.
+    """
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result: Any = None
+            self.error: Optional[BaseException] = None
+
+    def __init__(self):
+        self.shared = 0
+        self._calls: dict = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn, *args, **kwargs) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
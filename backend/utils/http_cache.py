@@ -0,0 +1,65 @@
+"""
+utils/http_cache.py
+-------------------
+Conditional GET and delta-sync helpers for the list endpoints.
+
+A list's version is its row count plus its newest `updated_at`, read with one
+single-row query instead of the full result.  The version, the user and the
+request's query string are hashed into a weak ETag; when the client sends it
+back in If-None-Match the route answers 304 without loading or encoding the
+list.  Responses carry ``Cache-Control: private, no-cache`` so browsers keep
+them and revalidate on every request.
+
+``since=`` takes an ISO timestamp (the newest `updated_at` a client holds) and
+routes return only rows updated after it.  Deleted rows do not appear in a
+delta; they change the row count, and so the ETag, and a full reload finds them.
+"""
+
+import hashlib
+from datetime import datetime
+
+from fastapi import HTTPException, Request, Response
+
+
+def parse_since(since: str | None) -> str | None:
+    """Validate a ``since`` timestamp; it is embedded in PostgREST filters."""
+    if not since:
+        return None
+    try:
+        return datetime.fromisoformat(since.replace("Z", "+00:00")).isoformat()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid since timestamp")
+
+
+def list_version(query) -> tuple:
+    """
+    (row count, newest updated_at) of a filtered table query built with
+    ``.select("updated_at", count="exact")``.
+    """
+    resp = query.order("updated_at", desc=True).limit(1).execute()
+    newest = resp.data[0]["updated_at"] if resp.data else None
+    return resp.count, newest
+
+
+def version_etag(request: Request, user_id: str, *version) -> str:
+    raw = "|".join(str(v) for v in (request.url.path, request.url.query, user_id, *version))
+    return 'W/"' + hashlib.sha1(raw.encode()).hexdigest()[:20] + '"'
+
+
+def not_modified(request: Request, etag: str) -> Response | None:
+    """A 304 response when If-None-Match already names ``etag``, else None."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    tags = {t.strip() for t in header.split(",")}
+    if etag in tags or "*" in tags:
+        return Response(status_code=304, headers=cache_headers(etag))
+    return None
+
+
+def cache_headers(etag: str) -> dict:
+    return {
+        "ETag":          etag,
+        "Cache-Control": "private, no-cache",
+        "Vary":          "Authorization",
+    }
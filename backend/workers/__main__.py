@@ -0,0 +1,15 @@
+"""
+workers/__main__.py
+-------------------
+Standalone processor entry point: ``python -m workers`` from the backend
+directory.
+
+Kept free of imports so spawned PDF extraction processes, which re-import the
+main module unless it is a package ``__main__``, stay as light as
+workers/pdf_extract promises.
+"""
+
+if __name__ == "__main__":
+    from workers.processor import main
+
+    main()
@@ -0,0 +1,28 @@
+"""
+workers/pdf_extract.py
+----------------------
+PDF text extraction run in worker processes.
+
+pypdf's ``extract_text`` is pure Python and holds the GIL for its whole run,
+so extracting large PDFs inside the API process slows every request handler.
+The processor sends page ranges of a PDF here to be run on a spawn-context
+process pool.  This module only imports pypdf, so spawned children start
+quickly and never load the app, Supabase or Gemini clients – provided the
+main module is light too: uvicorn's entry point, or workers/__main__.py for
+the standalone processor (``python -m workers``).  A spawned child re-imports
+any other main module.
+"""
+
+from typing import List
+
+import pypdf
+
+
+def page_count(path: str) -> int:
+    return len(pypdf.PdfReader(path).pages)
+
+
+def extract_page_range(path: str, start: int, stop: int) -> List[str]:
+    """Return the text of pages ``start`` to ``stop - 1`` of the PDF at ``path``."""
+    reader = pypdf.PdfReader(path)
+    return [(reader.pages[i].extract_text() or "") for i in range(start, stop)]
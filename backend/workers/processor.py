@@ -3,41 +3,122 @@ workers/processor.py
 --------------------
 Background document processing pipeline.
 
-Runs as a scheduled polling loop (every POLL_INTERVAL seconds) inside a
-dedicated daemon thread started at application startup.
+Runs as a dispatch loop, either inside a daemon thread of the API process
+(EMBEDDED_WORKER=1, the default) or standalone via ``python -m workers`` on
+as many nodes as needed.  Each cycle claims up to WORKER_POOL_SIZE pending
+documents and processes them concurrently on a thread pool.  Between cycles
+the loop sleeps until it is woken – by an upload route calling
+notify_new_document(), by a Postgres NOTIFY on the `documents_uploaded`
+channel (when DATABASE_URL is set and psycopg is installed), or by a
+document finishing – falling back to a poll every POLL_INTERVAL seconds.
 
 Pipeline for each unprocessed document:
-  1. Download file bytes from Supabase Storage.
-  2. Extract plain text (PDF via pypdf, DOCX via python-docx).
-  3. Call Google Gemini to generate an AI description.
-  4. Chunk the text and embed each chunk with Gemini text-embedding-004.
-  5. Store chunks + embeddings in Supabase.
-  6. Mark document as `ready` and `is_embedded = true`.
-  7. Create a `file_ready` notification for the uploader.
+  1. Stream the file from Supabase Storage into a temp file.
+  2. Extract text page by page (PDF via pypdf on a process pool in page-range
+     shards, DOCX via python-docx) and chunk it incrementally.
+  3. As each batch of chunks is ready, reuse vectors of chunks whose content
+     hash already exists in the document group, embed the rest with Gemini in
+     one batched request and bulk-insert chunks, then embeddings – on a
+     pipeline thread, overlapping with extraction of the next pages.
+  4. Call Google Gemini to generate an AI description from the first pages.
+  5. Mark document as `ready` and `is_embedded = true`.
+  6. Create a `file_ready` notification for the uploader.
+
+Documents are claimed atomically – by the `claim_documents` RPC (FOR UPDATE
+SKIP LOCKED) when it is installed, else by a conditional update – so
+concurrent workers never take the same one.  Claimed documents hold a lease
+(`lease_expires_at`) that every checkpoint and a heartbeat thread renew.
+Every update is conditional on `lease_owner`, so a worker whose document was
+reclaimed elsewhere stops instead of overwriting the new owner's progress.
+Progress is checkpointed per stored batch (`processed_chunks`,
+`processing_stage`) and chunk ids are derived from (document_id, chunk_index),
+so a document whose worker died – reclaimed once its lease lapses – or whose
+attempt failed resumes after the last stored chunk, and rewritten rows are
+upserted rather than duplicated.
 """
 
-import io
+import os
 import html
-import time
+import hashlib
+import itertools
+import multiprocessing
+import signal
+import socket
+import tempfile
 import threading
+import time
 import traceback
-from typing import List
+import uuid
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, timezone
+from typing import BinaryIO, Iterable, Iterator, List
 
 # ── Third-party ───────────────────────────────────────────────────────────────
 import pypdf
+import requests
 from docx import Document as DocxDocument
 
+try:
+    import psycopg
+except ImportError:                 # LISTEN/NOTIFY wake-ups are optional
+    psycopg = None
+
 # ── Internal ──────────────────────────────────────────────────────────────────
 from config.supabase import supabase
-from config.gemini import client as gemini_client
+from services import gemini_scheduler
+from services import text_index, vector_index
+from services.embedding_service import EMBED_MODEL, embed_texts, iter_batches, parse_vector
+from services.notification_sink import queue_notification
+from workers import pdf_extract
 
 # ── Constants ─────────────────────────────────────────────────────────────────
-POLL_INTERVAL = 30          # seconds between each poll cycle
+# New uploads wake the worker directly (notify_new_document / Postgres NOTIFY);
+# polling is only a safety net for missed signals.
+POLL_INTERVAL = int(os.getenv("POLL_INTERVAL", "300"))   # seconds
+# Optional direct Postgres connection for LISTEN (requires psycopg)
+DATABASE_URL  = os.getenv("DATABASE_URL")
+NOTIFY_CHANNEL = "documents_uploaded"
+# Number of documents processed concurrently by the worker pool.
+WORKER_POOL_SIZE = int(os.getenv("WORKER_POOL_SIZE", "4"))
 # Chunk size and overlap are character-level.  500/50 is a reasonable default
 # for typical academic paragraphs; tune via env vars if needed.
 CHUNK_SIZE    = 500         # target characters per chunk
 CHUNK_OVERLAP = 50          # character overlap between consecutive chunks
-EMBED_MODEL   = "gemini-embedding-001"
+# Rows per bulk insert into document_chunks / embeddings.  Embedding rows carry
+# a full vector each, so keep pages small enough for one PostgREST request.
+INSERT_PAGE_SIZE = int(os.getenv("INSERT_PAGE_SIZE", "200"))
+# Content hashes per lookup when searching earlier versions for reusable vectors
+# (each hash is 64 characters of the request URL).
+REUSE_LOOKUP_PAGE_SIZE = 100
+# Finished chunk batches allowed to wait for embedding/storage while
+# extraction continues; bounds per-document memory.
+PIPELINE_DEPTH = int(os.getenv("PIPELINE_DEPTH", "2"))
+EXCERPT_CHARS  = 2000       # leading characters sent for the AI description
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_URL_TTL    = 300   # seconds the worker's signed download URL is valid
+# Processes extracting PDF text off the API process's GIL (0 = in-thread),
+# shared by all documents; each process handles PDF_PAGES_PER_SHARD pages at a time.
+EXTRACT_PROCESSES   = int(os.getenv("EXTRACT_PROCESSES", str(os.cpu_count() or 1)))
+PDF_PAGES_PER_SHARD = int(os.getenv("PDF_PAGES_PER_SHARD", "16"))
+# A claimed document is leased for LEASE_SECONDS; every checkpoint renews the
+# lease, and documents whose lease lapsed (worker died) are claimed again.
+LEASE_SECONDS = int(os.getenv("LEASE_SECONDS", "900"))
+# Seconds between renewals of every in-flight document's lease, so a long
+# extraction or embedding step never outlives it.
+LEASE_HEARTBEAT = int(os.getenv("LEASE_HEARTBEAT", str(max(LEASE_SECONDS // 3, 1))))
+# Recorded as `lease_owner` on every claim; lease renewals and document updates
+# only match rows this worker still owns.
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+# Every claim counts as an attempt.  A released document waits
+# RETRY_BASE_SECONDS * 2^(attempts-1) (at most RETRY_MAX_SECONDS) before it can
+# be claimed again, and is marked `failed` after PROCESS_MAX_ATTEMPTS attempts.
+PROCESS_MAX_ATTEMPTS = int(os.getenv("PROCESS_MAX_ATTEMPTS", "5"))
+RETRY_BASE_SECONDS   = int(os.getenv("RETRY_BASE_SECONDS", "30"))
+RETRY_MAX_SECONDS    = int(os.getenv("RETRY_MAX_SECONDS", "3600"))
+# Namespace for deterministic chunk ids: uuid5(namespace, "<document_id>:<index>")
+CHUNK_ID_NAMESPACE = uuid.UUID("6f1c2a52-8d0e-4b7e-9a57-3c2f0e4d9b11")
 GEN_MODEL     = "gemini-2.0-flash"
 STORAGE_BUCKET = "scholar-sync-documents"
 
@@ -48,41 +129,141 @@ SUPPORTED_MIME_TYPES = {
 SUPPORTED_EXTENSIONS = {".pdf", ".docx"}
 
 
+# ──────────────────────────────────────────────────────────────────────────────
+# Download
+# ──────────────────────────────────────────────────────────────────────────────
+
+def download_to_tempfile(file_path: str) -> BinaryIO:
+    """
+    Stream a stored file into a temp file and return it rewound; the file is
+    deleted when closed.
+    Only DOWNLOAD_CHUNK_SIZE bytes are held in memory at a time.
+    """
+    signed = supabase.storage.from_(STORAGE_BUCKET).create_signed_url(file_path, DOWNLOAD_URL_TTL)
+    url = (
+        signed.get("signedURL")
+        or signed.get("signed_url")
+        or (signed.get("data") or {}).get("signedUrl")
+    )
+    if not url:
+        raise RuntimeError("signed URL not returned by storage")
+
+    # Named so extraction processes can open the same file by path
+    tmp = tempfile.NamedTemporaryFile(prefix="scholarsync-")
+    try:
+        with requests.get(url, stream=True, timeout=60) as resp:
+            resp.raise_for_status()
+            for block in resp.iter_content(DOWNLOAD_CHUNK_SIZE):
+                tmp.write(block)
+    except Exception:
+        tmp.close()
+        raise
+    tmp.seek(0)
+    return tmp
+
+
 # ──────────────────────────────────────────────────────────────────────────────
 # Text Extraction
 # ──────────────────────────────────────────────────────────────────────────────
 
-def extract_text_from_pdf(file_bytes: bytes) -> str:
+# Created on first use so importing this module never spawns processes
+_extract_pool: ProcessPoolExecutor | None = None
+_extract_pool_lock = threading.Lock()
+
+
+def _get_extract_pool() -> ProcessPoolExecutor:
+    global _extract_pool
+    with _extract_pool_lock:
+        if _extract_pool is None:
+            _extract_pool = ProcessPoolExecutor(
+                max_workers=EXTRACT_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _extract_pool
+
+
+def _reset_extract_pool(broken: ProcessPoolExecutor) -> None:
+    """Drop a pool whose child died so the next document gets a fresh one."""
+    global _extract_pool
+    with _extract_pool_lock:
+        if _extract_pool is broken:
+            _extract_pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _iter_pdf_pages_sharded(path: str) -> Iterator[str]:
+    """
+    Extract page ranges of the PDF at ``path`` on the process pool and yield
+    page texts in order.  At most 2 × EXTRACT_PROCESSES ranges are queued per
+    document, so a huge PDF neither floods the pool nor buffers all its text.
+    """
+    pool = _get_extract_pool()
+    try:
+        total_pages = pool.submit(pdf_extract.page_count, path).result()
+        ranges = iter(
+            (start, min(start + PDF_PAGES_PER_SHARD, total_pages))
+            for start in range(0, total_pages, PDF_PAGES_PER_SHARD)
+        )
+        print(
+            f"[PROCESSOR]   {total_pages} pages in shards of {PDF_PAGES_PER_SHARD} "
+            f"on {EXTRACT_PROCESSES} process(es)"
+        )
+        pending: deque = deque()
+        for start, stop in itertools.islice(ranges, 2 * EXTRACT_PROCESSES):
+            pending.append(pool.submit(pdf_extract.extract_page_range, path, start, stop))
+        while pending:
+            pages = pending.popleft().result()
+            nxt = next(ranges, None)
+            if nxt is not None:
+                pending.append(pool.submit(pdf_extract.extract_page_range, path, *nxt))
+            yield from pages
+    except BrokenProcessPool:
+        _reset_extract_pool(pool)
+        raise
+
+
+def iter_pdf_pages(source: BinaryIO) -> Iterator[str]:
+    """
+    Yield the text of each PDF page in order.  When ``source`` is a named file
+    and EXTRACT_PROCESSES > 0, pages are extracted on the process pool;
+    otherwise pypdf runs lazily on this thread.
+    """
     print("[PROCESSOR] Extracting text from PDF …")
-    reader = pypdf.PdfReader(io.BytesIO(file_bytes))
-    pages_text = []
-    for i, page in enumerate(reader.pages):
-        page_text = page.extract_text() or ""
-        pages_text.append(page_text)
-        print(f"[PROCESSOR]   PDF page {i + 1}/{len(reader.pages)}: {len(page_text)} chars")
-    full_text = "\n".join(pages_text)
-    print(f"[PROCESSOR] PDF extraction complete – {len(full_text)} total chars")
-    return full_text
-
-
-def extract_text_from_docx(file_bytes: bytes) -> str:
+    path = getattr(source, "name", None)
+    if EXTRACT_PROCESSES > 0 and isinstance(path, str) and os.path.exists(path):
+        source.flush()
+        pages = _iter_pdf_pages_sharded(path)
+    else:
+        pages = ((page.extract_text() or "") for page in pypdf.PdfReader(source).pages)
+
+    total_chars = 0
+    for i, page_text in enumerate(pages):
+        total_chars += len(page_text)
+        print(f"[PROCESSOR]   PDF page {i + 1}: {len(page_text)} chars")
+        yield page_text
+    print(f"[PROCESSOR] PDF extraction complete – {total_chars} total chars")
+
+
+def iter_docx_paragraphs(source: BinaryIO) -> Iterator[str]:
     print("[PROCESSOR] Extracting text from DOCX …")
-    doc = DocxDocument(io.BytesIO(file_bytes))
-    paragraphs = [p.text for p in doc.paragraphs if p.text.strip()]
-    full_text = "\n".join(paragraphs)
-    print(f"[PROCESSOR] DOCX extraction complete – {len(paragraphs)} paragraphs, {len(full_text)} total chars")
-    return full_text
+    doc = DocxDocument(source)
+    count = 0
+    for p in doc.paragraphs:
+        if p.text.strip():
+            count += 1
+            yield p.text
+    print(f"[PROCESSOR] DOCX extraction complete – {count} paragraphs")
 
 
-def extract_text(file_bytes: bytes, file_name: str, mime_type: str | None) -> str | None:
-    """Return plain text or None if the file type is unsupported."""
+def iter_text(source: BinaryIO, file_name: str, mime_type: str | None) -> Iterator[str] | None:
+    """Return a lazy iterator of text pieces, or None if the file type is unsupported."""
     lower_name = (file_name or "").lower()
     if lower_name.endswith(".pdf") or mime_type == "application/pdf":
-        return extract_text_from_pdf(file_bytes)
+        return iter_pdf_pages(source)
     if lower_name.endswith(".docx") or mime_type == (
         "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
     ):
-        return extract_text_from_docx(file_bytes)
+        return iter_docx_paragraphs(source)
     print(f"[PROCESSOR] Unsupported file type: name={file_name}, mime={mime_type} – skipping")
     return None
 
@@ -91,33 +272,31 @@ def extract_text(file_bytes: bytes, file_name: str, mime_type: str | None) -> st
 # Chunking
 # ──────────────────────────────────────────────────────────────────────────────
 
-def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[str]:
+def iter_chunks(pieces: Iterable[str], chunk_size: int = CHUNK_SIZE,
+                overlap: int = CHUNK_OVERLAP) -> Iterator[str]:
     """
-    Split text into overlapping character-level chunks.
-    Tries to break at paragraph boundaries first.
+    Incrementally split a stream of text pieces (pages, paragraphs) into
+    overlapping character-level chunks, breaking at line boundaries first.
     """
-    print(f"[PROCESSOR] Chunking text (chunk_size={chunk_size}, overlap={overlap}) …")
-    paragraphs = [p.strip() for p in text.split("\n") if p.strip()]
-    chunks: List[str] = []
     current = ""
-
-    for para in paragraphs:
-        if len(current) + len(para) + 1 <= chunk_size:
-            current = (current + "\n" + para).strip()
-        else:
-            if current:
-                chunks.append(current)
-            # If the paragraph itself is too long, hard-split it
-            while len(para) > chunk_size:
-                chunks.append(para[:chunk_size])
-                para = para[chunk_size - overlap:]
-            current = para
+    for piece in pieces:
+        for para in piece.split("\n"):
+            para = para.strip()
+            if not para:
+                continue
+            if len(current) + len(para) + 1 <= chunk_size:
+                current = (current + "\n" + para).strip()
+            else:
+                if current:
+                    yield current
+                # If the paragraph itself is too long, hard-split it
+                while len(para) > chunk_size:
+                    yield para[:chunk_size]
+                    para = para[chunk_size - overlap:]
+                current = para
 
     if current:
-        chunks.append(current)
-
-    print(f"[PROCESSOR] Chunking complete – {len(chunks)} chunks")
-    return chunks
+        yield current
 
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -135,16 +314,217 @@ def generate_ai_description(human_description: str, text_excerpt: str) -> str:
         f"Document excerpt (first 2000 chars):\n{text_excerpt[:2000]}\n\n"
         "AI description:"
     )
-    response = gemini_client.models.generate_content(model=GEN_MODEL, contents=prompt)
+    response = gemini_scheduler.generate_content(GEN_MODEL, prompt)
     description = response.text.strip()
     print(f"[PROCESSOR] AI description generated ({len(description)} chars)")
     return description
 
 
-def embed_text(text: str) -> List[float]:
-    """Return a 768-dimensional embedding vector for the given text."""
-    response = gemini_client.models.embed_content(model=EMBED_MODEL, content=text)
-    return response.embeddings[0].values
+# ──────────────────────────────────────────────────────────────────────────────
+# Embedding Reuse
+# ──────────────────────────────────────────────────────────────────────────────
+
+def chunk_id_for(document_id: str, chunk_index: int) -> str:
+    """Stable chunk id, so a re-run of the same chunk overwrites its earlier row."""
+    return str(uuid.uuid5(CHUNK_ID_NAMESPACE, f"{document_id}:{chunk_index}"))
+
+
+def chunk_hash(text: str) -> str:
+    """Content address of a chunk: identical text under the same model → same hash."""
+    return hashlib.sha256(f"{EMBED_MODEL}\0{text}".encode("utf-8")).hexdigest()
+
+
+def find_reusable_vectors(group_id: str, hashes: List[str]) -> dict:
+    """
+    Return ``{content_hash: vector}`` for chunks already embedded anywhere in
+    the same document group (i.e. earlier versions of this document).
+    """
+    found: dict = {}
+    unique = list(dict.fromkeys(hashes))
+    for start in range(0, len(unique), REUSE_LOOKUP_PAGE_SIZE):
+        page = unique[start:start + REUSE_LOOKUP_PAGE_SIZE]
+        resp = supabase.table("embeddings") \
+            .select("vector, document_chunks!inner(content_hash)") \
+            .eq("group_id", group_id) \
+            .eq("model_name", EMBED_MODEL) \
+            .in_("document_chunks.content_hash", page) \
+            .execute()
+        for row in (resp.data or []):
+            content_hash = (row.get("document_chunks") or {}).get("content_hash")
+            if content_hash and content_hash not in found:
+                found[content_hash] = parse_vector(row["vector"])
+    return found
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Bulk Persistence
+# ──────────────────────────────────────────────────────────────────────────────
+
+def _upsert_paged(table: str, rows: List[dict], on_conflict: str):
+    for start in range(0, len(rows), INSERT_PAGE_SIZE):
+        supabase.table(table) \
+            .upsert(rows[start:start + INSERT_PAGE_SIZE], on_conflict=on_conflict) \
+            .execute()
+
+
+def store_chunks(chunk_rows: List[dict], embedding_rows: List[dict]):
+    """
+    Write a batch of chunks, then their embeddings.
+
+    Chunk ids are derived from (document_id, chunk_index), so the embedding
+    rows can be built before anything is written and both writes are upserts:
+    rewriting a batch after a crash replaces its rows instead of duplicating
+    them.  If any page fails, every chunk written by this call is deleted again
+    (embeddings cascade), so a document never keeps chunks without vectors.
+    """
+    try:
+        _upsert_paged("document_chunks", chunk_rows, on_conflict="document_id,chunk_index")
+        _upsert_paged("embeddings", embedding_rows, on_conflict="chunk_id")
+    except Exception:
+        chunk_ids = [row["chunk_id"] for row in chunk_rows]
+        for start in range(0, len(chunk_ids), INSERT_PAGE_SIZE):
+            try:
+                supabase.table("document_chunks") \
+                    .delete() \
+                    .in_("chunk_id", chunk_ids[start:start + INSERT_PAGE_SIZE]) \
+                    .execute()
+            except Exception as exc:
+                print(f"[PROCESSOR]   WARNING – failed to roll back chunks: {exc}")
+        raise
+
+
+def embed_and_store_batch(document_id: str, group_id: str | None,
+                          start_index: int, batch: List[str]) -> tuple[int, int]:
+    """
+    Embed one batch of consecutive chunks (reusing stored vectors where the
+    content hash matches), persist it and checkpoint the document's progress.
+    Returns ``(stored, reused)``.  Raises if the batch could not be stored.
+    """
+    hashes = [chunk_hash(c) for c in batch]
+    vectors_by_hash: dict = {}
+    if group_id:
+        try:
+            vectors_by_hash = find_reusable_vectors(group_id, hashes)
+        except Exception as exc:
+            print(f"[PROCESSOR]   WARNING – embedding reuse lookup failed: {exc}")
+    reused = sum(1 for h in hashes if h in vectors_by_hash)
+
+    # Each distinct new text is embedded once, even if it repeats in the batch
+    to_embed = list(dict.fromkeys(
+        c for c, h in zip(batch, hashes) if h not in vectors_by_hash
+    ))
+    last_index = start_index + len(batch)
+    if to_embed:
+        print(f"[PROCESSOR]   Embedding {len(to_embed)} new chunk(s) of {start_index + 1}–{last_index}")
+        # A failure propagates: the checkpoint stays at the last stored batch
+        # and the retry resumes here instead of skipping these chunks.
+        for text_content, vector in zip(to_embed, embed_texts(to_embed)):
+            vectors_by_hash[chunk_hash(text_content)] = vector
+
+    chunk_rows: List[dict] = []
+    embedding_rows: List[dict] = []
+    for offset, (chunk_text_content, content_hash) in enumerate(zip(batch, hashes)):
+        vector = vectors_by_hash[content_hash]
+        chunk_id = chunk_id_for(document_id, start_index + offset)
+        chunk_rows.append({
+            "chunk_id":     chunk_id,
+            "document_id":  document_id,
+            "chunk_index":  start_index + offset,
+            "text_content": chunk_text_content,
+            "content_hash": content_hash,
+        })
+        embedding_rows.append({
+            "chunk_id":    chunk_id,
+            "document_id": document_id,
+            "group_id":    group_id,
+            "model_name":  EMBED_MODEL,
+            "vector":      vector,
+        })
+
+    store_chunks(chunk_rows, embedding_rows)
+    vector_index.add_embeddings(embedding_rows)
+    text_index.add_chunks(chunk_rows, group_id)
+    # Batches are stored in order on one thread, so this is a safe resume point
+    _checkpoint(document_id, "embedding", processed_chunks=last_index)
+    print(f"[PROCESSOR]   Stored chunks {start_index + 1}–{last_index} ({len(chunk_rows)} rows) ✓")
+    return len(chunk_rows), reused
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Leases & Checkpoints
+# ──────────────────────────────────────────────────────────────────────────────
+
+class LeaseLost(Exception):
+    """The document's lease passed to another worker; stop without touching it."""
+
+
+def _lease_deadline() -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=LEASE_SECONDS)).isoformat()
+
+
+def _update_owned(document_id: str, fields: dict):
+    """
+    Update a document this worker holds the lease on.  Raises LeaseLost when
+    the row no longer names this worker as `lease_owner`.
+    """
+    resp = supabase.table("documents") \
+        .update(fields) \
+        .eq("document_id", document_id) \
+        .eq("lease_owner", WORKER_ID) \
+        .execute()
+    if not resp.data:
+        raise LeaseLost(document_id)
+
+
+def _check_lease(document_id: str):
+    """Raise LeaseLost once the heartbeat found the lease taken over."""
+    with _leased_lock:
+        if document_id in _lost:
+            raise LeaseLost(document_id)
+
+
+def _checkpoint(document_id: str, stage: str, **fields):
+    """Record the current stage (plus any progress fields) and renew the lease."""
+    _update_owned(document_id, {
+        "processing_stage": stage,
+        "lease_expires_at": _lease_deadline(),
+        **fields,
+    })
+
+
+def _mark_failed(document_id: str, attempts: int):
+    _update_owned(document_id, {
+        "status":           "failed",
+        "lease_expires_at": None,
+        "lease_owner":      None,
+    })
+    print(f"[PROCESSOR] document_id={document_id} → status=failed after {attempts} attempt(s)")
+
+
+def _retry_delay(attempts: int) -> int:
+    return min(RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0), RETRY_MAX_SECONDS)
+
+
+def _release(document_id: str, attempts: int) -> bool:
+    """
+    Hand a failed attempt back to the queue; its checkpoints are kept for the
+    retry, which is not claimable before `next_attempt_at`.  After
+    PROCESS_MAX_ATTEMPTS attempts the document is marked `failed` instead.
+    Returns True when the document will be retried.
+    """
+    if attempts >= PROCESS_MAX_ATTEMPTS:
+        _mark_failed(document_id, attempts)
+        return False
+
+    delay = _retry_delay(attempts)
+    _update_owned(document_id, {
+        "status":           "uploaded",
+        "lease_expires_at": None,
+        "lease_owner":      None,
+        "next_attempt_at":  (datetime.now(timezone.utc) + timedelta(seconds=delay)).isoformat(),
+    })
+    print(f"[PROCESSOR] document_id={document_id} will be retried in {delay}s (attempt {attempts})")
+    return True
 
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -153,21 +533,17 @@ def embed_text(text: str) -> List[float]:
 
 def _create_notification(user_id: str, notif_type: str, title: str, message: str,
                           doc_id: str | None = None, group_id: str | None = None):
-    try:
-        payload = {
-            "user_id": user_id,
-            "type": notif_type,
-            "title": title,
-            "message": message,
-        }
-        if doc_id:
-            payload["related_doc_id"] = doc_id
-        if group_id:
-            payload["related_group_id"] = group_id
-        supabase.table("notifications").insert(payload).execute()
-        print(f"[PROCESSOR] Notification created: type={notif_type} for user={user_id}")
-    except Exception as exc:
-        print(f"[PROCESSOR] WARNING – failed to create notification: {exc}")
+    """Queue a notification; services.notification_sink writes it in bulk."""
+    payload = {
+        "user_id": user_id,
+        "type": notif_type,
+        "title": title,
+        "message": message,
+        "related_doc_id": doc_id,
+        "related_group_id": group_id,
+    }
+    queue_notification(payload)
+    print(f"[PROCESSOR] Notification queued: type={notif_type} for user={user_id}")
 
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -181,16 +557,20 @@ def process_document(doc: dict):
     file_name   = doc.get("file_name", "")
     mime_type   = doc.get("mime_type")
     human_desc  = doc.get("human_description") or ""
+    # Progress left by an earlier attempt that died or failed part-way
+    resume_from = doc.get("processed_chunks") or 0
+    stage       = doc.get("processing_stage")
+    ai_description = doc.get("ai_description")
+    attempts    = doc.get("attempts") or 1
 
     print(f"\n[PROCESSOR] ══════════════════════════════════════════")
     print(f"[PROCESSOR] Processing document_id={document_id}")
     print(f"[PROCESSOR] file_name={file_name}, mime_type={mime_type}")
     print(f"[PROCESSOR] ══════════════════════════════════════════")
+    if stage:
+        print(f"[PROCESSOR] Resuming from stage={stage}, processed_chunks={resume_from}")
 
-    # ── 1. Mark as processing and notify uploader ─────────────────────────────
-    supabase.table("documents").update({"status": "processing"}) \
-        .eq("document_id", document_id).execute()
-    print("[PROCESSOR] Status → processing")
+    # ── 1. Notify uploader (status → processing happened when it was claimed) ─
 
     # Resolve uploader user_id via the document_groups table
     uploader_id: str | None = None
@@ -202,7 +582,13 @@ def process_document(doc: dict):
     except Exception:
         pass
 
-    if uploader_id:
+    # Reclaimed after its worker died too often (e.g. the file crashes it)
+    if attempts > PROCESS_MAX_ATTEMPTS:
+        _mark_failed(document_id, attempts - 1)
+        _notify_failed(uploader_id, document_id, group_id, file_name)
+        return
+
+    if uploader_id and not stage and attempts == 1:
         safe_name = html.escape(file_name)
         _create_notification(
             uploader_id,
@@ -213,23 +599,97 @@ def process_document(doc: dict):
             group_id=group_id,
         )
 
-    # ── 2. Download file from Supabase Storage ────────────────────────────────
+    # Chunks are stored and the description exists – only the final update is missing
+    if stage == "describing" and ai_description:
+        _finish_document(document_id, group_id, file_name, uploader_id)
+        return
+
+    # ── 2. Download file from Supabase Storage into a temp file ─────────────
     print(f"[PROCESSOR] Downloading file from storage: {file_path}")
     try:
-        file_bytes = supabase.storage.from_(STORAGE_BUCKET).download(file_path)
-        print(f"[PROCESSOR] Downloaded {len(file_bytes)} bytes")
+        source = download_to_tempfile(file_path)
+        print(f"[PROCESSOR] Downloaded {source.seek(0, os.SEEK_END)} bytes")
+        source.seek(0)
     except Exception as exc:
         print(f"[PROCESSOR] ERROR downloading file: {exc}")
-        supabase.table("documents").update({"status": "uploaded"}) \
-            .eq("document_id", document_id).execute()
+        if not _release(document_id, attempts):
+            _notify_failed(uploader_id, document_id, group_id, file_name)
+        return
+
+    # ── 3–6. Extract → chunk → embed → store, streamed in batches ─────────────
+    # Pages are extracted lazily and chunked incrementally on this thread while
+    # a single pipeline thread embeds and stores finished batches.  At most
+    # PIPELINE_DEPTH batches are in flight, so memory does not grow with the
+    # length of the document.  Chunks below ``resume_from`` were stored by an
+    # earlier attempt; they are re-extracted (to find their positions) but not
+    # embedded or written again.
+    excerpt_parts: List[str] = []
+    excerpt_len = 0
+
+    def _capture_excerpt(pieces: Iterable[str]) -> Iterator[str]:
+        nonlocal excerpt_len
+        for piece in pieces:
+            if excerpt_len < EXCERPT_CHARS:
+                excerpt_parts.append(piece[:EXCERPT_CHARS - excerpt_len])
+                excerpt_len += len(excerpt_parts[-1]) + 1
+            yield piece
+
+    # Once a batch fails, later batches must not run: their checkpoint would
+    # skip past the chunks that were never stored.
+    failed = threading.Event()
+
+    def _store_batch(start_index: int, batch: List[str]) -> tuple[int, int]:
+        if failed.is_set():
+            return 0, 0
+        try:
+            _check_lease(document_id)
+            return embed_and_store_batch(document_id, group_id, start_index, batch)
+        except Exception:
+            failed.set()
+            raise
+
+    total = stored = reused = 0
+    try:
+        pieces = iter_text(source, file_name, mime_type)
+        if pieces is not None:
+            with ThreadPoolExecutor(max_workers=1, thread_name_prefix="doc-pipeline") as pipeline:
+                pending: deque = deque()
+                for batch in iter_batches(iter_chunks(_capture_excerpt(pieces))):
+                    _check_lease(document_id)
+                    start = total
+                    total += len(batch)
+                    if total <= resume_from:
+                        continue
+                    skip = max(0, resume_from - start)
+                    pending.append(pipeline.submit(_store_batch, start + skip, batch[skip:]))
+                    while len(pending) >= PIPELINE_DEPTH:
+                        s_, r_ = pending.popleft().result()
+                        stored += s_
+                        reused += r_
+                while pending:
+                    s_, r_ = pending.popleft().result()
+                    stored += s_
+                    reused += r_
+    except LeaseLost:
+        raise
+    except Exception as exc:
+        print(f"[PROCESSOR] ERROR in extract/embed pipeline: {exc} – resetting to uploaded")
+        traceback.print_exc()
+        # Stored batches stay; the retry resumes after the last checkpoint
+        if not _release(document_id, attempts):
+            _notify_failed(uploader_id, document_id, group_id, file_name)
         return
+    finally:
+        source.close()
 
-    # ── 3. Extract text ───────────────────────────────────────────────────────
-    text = extract_text(file_bytes, file_name, mime_type)
-    if not text or not text.strip():
+    if total == 0:
         print("[PROCESSOR] No text extracted – marking as ready without embeddings")
-        supabase.table("documents").update({"status": "ready"}) \
-            .eq("document_id", document_id).execute()
+        _update_owned(document_id, {
+            "status":           "ready",
+            "processing_stage": "done",
+            "lease_expires_at": None,
+            "lease_owner":      None,
+        })
         if uploader_id:
             _create_notification(
                 uploader_id, "file_ready",
@@ -239,70 +699,62 @@ def process_document(doc: dict):
             )
         return
 
-    # ── 4. Generate AI description ────────────────────────────────────────────
-    print("[PROCESSOR] Generating AI description …")
-    try:
-        ai_description = generate_ai_description(human_desc, text)
-        supabase.table("documents").update({"ai_description": ai_description}) \
-            .eq("document_id", document_id).execute()
-        # Also update the group-level ai_description
-        if group_id:
-            supabase.table("document_groups").update({"ai_description": ai_description}) \
-                .eq("doc_group_id", group_id).execute()
-        print("[PROCESSOR] AI description saved to database")
-    except Exception as exc:
-        print(f"[PROCESSOR] WARNING – AI description generation failed: {exc}")
-        ai_description = human_desc  # fall back to human description
-
-    # ── 5. Chunk text ─────────────────────────────────────────────────────────
-    chunks = chunk_text(text)
-    if not chunks:
-        print("[PROCESSOR] No chunks produced – skipping embedding")
-        supabase.table("documents").update({"status": "ready"}) \
-            .eq("document_id", document_id).execute()
-        return
+    new_chunks = total - min(resume_from, total)
+    print(f"[PROCESSOR] Stored {stored}/{new_chunks} new chunks ({total} in document) ✓")
+    if new_chunks:
+        print(
+            f"[PROCESSOR] Reused {reused}/{new_chunks} vectors from earlier versions "
+            f"({reused / new_chunks:.0%} reuse ratio)"
+        )
+    _checkpoint(document_id, "describing", processed_chunks=total)
 
-    # ── 6. Embed and store each chunk ─────────────────────────────────────────
-    print(f"[PROCESSOR] Embedding {len(chunks)} chunks …")
-    for idx, chunk_text_content in enumerate(chunks):
-        print(f"[PROCESSOR]   Embedding chunk {idx + 1}/{len(chunks)} ({len(chunk_text_content)} chars)")
+    # ── 6b. Generate AI description from the captured excerpt ────────────────
+    if ai_description:
+        print("[PROCESSOR] AI description already saved by an earlier attempt")
+    else:
+        print("[PROCESSOR] Generating AI description …")
         try:
-            # Insert chunk record
-            chunk_resp = supabase.table("document_chunks").insert({
-                "document_id": document_id,
-                "chunk_index": idx,
-                "text_content": chunk_text_content,
-            }).execute()
-
-            if not chunk_resp.data:
-                print(f"[PROCESSOR]   WARNING – chunk insert returned no data for index {idx}")
-                continue
+            ai_description = generate_ai_description(human_desc, "\n".join(excerpt_parts))
+            _update_owned(document_id, {"ai_description": ai_description})
+            # Also update the group-level ai_description
+            if group_id:
+                supabase.table("document_groups").update({"ai_description": ai_description}) \
+                    .eq("doc_group_id", group_id).execute()
+            print("[PROCESSOR] AI description saved to database")
+        except LeaseLost:
+            raise
+        except Exception as exc:
+            print(f"[PROCESSOR] WARNING – AI description generation failed: {exc}")
 
-            chunk_id = chunk_resp.data[0]["chunk_id"]
+    _finish_document(document_id, group_id, file_name, uploader_id)
 
-            # Generate embedding
-            vector = embed_text(chunk_text_content)
-            print(f"[PROCESSOR]   Embedding vector length: {len(vector)}")
 
-            # Store embedding
-            supabase.table("embeddings").insert({
-                "chunk_id":    chunk_id,
-                "document_id": document_id,
-                "group_id":    group_id,
-                "model_name":  EMBED_MODEL,
-                "vector":      vector,
-            }).execute()
-            print(f"[PROCESSOR]   Chunk {idx + 1} embedded and stored ✓")
+def _notify_failed(uploader_id: str | None, document_id: str, group_id: str | None,
+                   file_name: str):
+    if uploader_id:
+        _create_notification(
+            uploader_id,
+            "file_failed",
+            "Document processing failed",
+            f'<strong>{html.escape(file_name)}</strong> could not be processed. '
+            f'Please re-upload the file or contact an administrator.',
+            doc_id=document_id,
+            group_id=group_id,
+        )
 
-        except Exception as exc:
-            print(f"[PROCESSOR]   ERROR on chunk {idx + 1}: {exc}")
-            traceback.print_exc()
 
+def _finish_document(document_id: str, group_id: str | None, file_name: str,
+                     uploader_id: str | None):
     # ── 7. Mark as ready ──────────────────────────────────────────────────────
-    supabase.table("documents").update({
-        "status":      "ready",
-        "is_embedded": True,
-    }).eq("document_id", document_id).execute()
+    _update_owned(document_id, {
+        "status":           "ready",
+        "is_embedded":      True,
+        "processing_stage": "done",
+        "lease_expires_at": None,
+        "lease_owner":      None,
+        "attempts":         0,
+        "next_attempt_at":  None,
+    })
     print(f"[PROCESSOR] document_id={document_id} → status=ready, is_embedded=True")
 
     # ── 8. Notify uploader ────────────────────────────────────────────────────
@@ -323,43 +775,267 @@ def process_document(doc: dict):
 # Polling Loop
 # ──────────────────────────────────────────────────────────────────────────────
 
-def _poll_once():
-    """Look for one unprocessed document and process it."""
-    print("[PROCESSOR] Polling for unprocessed documents …")
-    try:
-        resp = supabase.table("documents") \
-            .select("*") \
-            .eq("status", "uploaded") \
-            .order("created_at") \
-            .limit(1) \
-            .execute()
+# Set whenever a pool slot frees up so the loop can claim more work without
+# waiting for the full POLL_INTERVAL.
+_wake_event = threading.Event()
+
+
+def notify_new_document():
+    """Wake the dispatch loop; called by upload routes after inserting a document."""
+    _wake_event.set()
+
+
+def _listen_loop():
+    """
+    Wake the dispatch loop on every Postgres NOTIFY sent by the
+    `documents_notify_uploaded` trigger, so documents uploaded through another
+    process are picked up at once.  Reconnects after connection errors.
+    """
+    while True:
+        try:
+            with psycopg.connect(DATABASE_URL, autocommit=True) as conn:
+                conn.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                print(f"[PROCESSOR] Listening for '{NOTIFY_CHANNEL}' notifications")
+                _wake_event.set()       # catch anything uploaded while disconnected
+                for _notify in conn.notifies():
+                    _wake_event.set()
+        except Exception as exc:
+            print(f"[PROCESSOR] WARNING – LISTEN connection lost: {exc}; retrying in 5s")
+            time.sleep(5)
+
+
+# False once the claim_documents RPC turned out to be missing
+_claim_rpc_available = True
+
+
+def _claim_documents(limit: int) -> List[dict]:
+    """
+    Claim up to ``limit`` pending documents for this worker: ``uploaded``
+    ones whose retry backoff (`next_attempt_at`) has passed plus
+    ``processing`` ones whose lease has lapsed (their worker died), oldest
+    first.  Each claim increments `attempts`.
+
+    The `claim_documents` RPC selects and leases them in one statement with
+    FOR UPDATE SKIP LOCKED, so concurrent workers skip each other's rows.
+    Without it, each candidate is flipped by a conditional update that only
+    matches while the row is unchanged, so exactly one racing worker gets a
+    row back.
+    """
+    global _claim_rpc_available
+    if _claim_rpc_available:
+        try:
+            resp = supabase.rpc("claim_documents", {
+                "p_limit":         limit,
+                "p_lease_seconds": LEASE_SECONDS,
+                "p_worker_id":     WORKER_ID,
+            }).execute()
+            return resp.data or []
+        except Exception as exc:
+            # Function not found (or the older version without p_worker_id)
+            if getattr(exc, "code", None) != "PGRST202":
+                raise
+            _claim_rpc_available = False
+            print("[PROCESSOR] claim_documents RPC not installed – using conditional updates")
+
+    now = datetime.now(timezone.utc).isoformat()
+    resp = supabase.table("documents") \
+        .select("*") \
+        .or_(
+            f"and(status.eq.uploaded,or(next_attempt_at.is.null,next_attempt_at.lte.{now})),"
+            f"and(status.eq.processing,lease_expires_at.lt.{now}),"
+            "and(status.eq.processing,lease_expires_at.is.null)"
+        ) \
+        .order("created_at") \
+        .limit(limit) \
+        .execute()
+
+    claimed: List[dict] = []
+    for doc in (resp.data or []):
+        query = supabase.table("documents") \
+            .update({
+                "status":           "processing",
+                "lease_expires_at": _lease_deadline(),
+                "lease_owner":      WORKER_ID,
+                "attempts":         (doc.get("attempts") or 0) + 1,
+            }) \
+            .eq("document_id", doc["document_id"]) \
+            .eq("status", doc["status"])
+        if doc["status"] == "processing":
+            print(f"[PROCESSOR] Reclaiming document_id={doc['document_id']} (lease expired)")
+            if doc.get("lease_expires_at") is None:
+                query = query.is_("lease_expires_at", "null")
+            else:
+                query = query.eq("lease_expires_at", doc["lease_expires_at"])
+        upd = query.execute()
+        if upd.data:
+            claimed.append(upd.data[0])
+        else:
+            print(f"[PROCESSOR] document_id={doc['document_id']} already claimed by another worker")
+    return claimed
+
+
+# Documents this process is working on; the heartbeat renews their leases.
+# Those whose renewal matched no row (another worker owns them now) move to
+# _lost, and their processing stops at the next check.
+_leased: set = set()
+_lost: set = set()
+_leased_lock = threading.Lock()
 
-        if not resp.data:
-            print("[PROCESSOR] No pending documents found.")
-            return
 
-        doc = resp.data[0]
+def _heartbeat_loop():
+    while True:
+        time.sleep(LEASE_HEARTBEAT)
+        with _leased_lock:
+            ids = list(_leased - _lost)
+        if not ids:
+            continue
+        try:
+            resp = supabase.table("documents") \
+                .update({"lease_expires_at": _lease_deadline()}) \
+                .in_("document_id", ids) \
+                .eq("lease_owner", WORKER_ID) \
+                .eq("status", "processing") \
+                .execute()
+        except Exception as exc:
+            print(f"[PROCESSOR] WARNING – lease heartbeat failed: {exc}")
+            continue
+        renewed = {row["document_id"] for row in resp.data or []}
+        with _leased_lock:
+            # Documents that finished meanwhile have already left _leased
+            lost = {i for i in ids if i not in renewed and i in _leased}
+            _lost.update(lost)
+        for document_id in lost:
+            print(f"[PROCESSOR] WARNING – lease on document_id={document_id} lost; stopping")
+
+
+def _process_safely(doc: dict):
+    document_id = doc.get("document_id")
+    with _leased_lock:
+        _leased.add(document_id)
+        _lost.discard(document_id)
+    try:
         process_document(doc)
+    except LeaseLost:
+        print(f"[PROCESSOR] document_id={document_id} was taken over by another worker – abandoned")
+    except Exception as exc:
+        print(f"[PROCESSOR] ERROR processing document_id={document_id}: {exc}")
+        traceback.print_exc()
+    finally:
+        with _leased_lock:
+            _leased.discard(document_id)
+            _lost.discard(document_id)
+
 
+def _poll_once(pool: ThreadPoolExecutor, free_slots: int) -> List[Future]:
+    """Claim up to ``free_slots`` unprocessed documents and submit them to the pool."""
+    print("[PROCESSOR] Polling for unprocessed documents …")
+    try:
+        docs = _claim_documents(free_slots)
     except Exception as exc:
         print(f"[PROCESSOR] ERROR during poll: {exc}")
         traceback.print_exc()
+        return []
+
+    if not docs:
+        print("[PROCESSOR] No pending documents found.")
+        return []
+
+    print(f"[PROCESSOR] Claimed {len(docs)} document(s)")
+    futures = []
+    for doc in docs:
+        fut = pool.submit(_process_safely, doc)
+        fut.add_done_callback(lambda _f: _wake_event.set())
+        futures.append(fut)
+    return futures
+
+
+def _next_retry_in() -> float | None:
+    """Seconds until the earliest backed-off document becomes claimable, if any."""
+    try:
+        resp = supabase.table("documents") \
+            .select("next_attempt_at") \
+            .eq("status", "uploaded") \
+            .gt("next_attempt_at", datetime.now(timezone.utc).isoformat()) \
+            .order("next_attempt_at") \
+            .limit(1) \
+            .execute()
+    except Exception as exc:
+        print(f"[PROCESSOR] WARNING – could not look up pending retries: {exc}")
+        return None
+    if not resp.data:
+        return None
+    due = datetime.fromisoformat(resp.data[0]["next_attempt_at"].replace("Z", "+00:00"))
+    return max((due - datetime.now(timezone.utc)).total_seconds(), 0.0)
 
 
 def _run_loop():
-    print(f"[PROCESSOR] Background worker started (polling every {POLL_INTERVAL}s)")
-    while True:
-        try:
-            _poll_once()
-        except Exception as exc:
-            print(f"[PROCESSOR] Unhandled error in poll loop: {exc}")
-            traceback.print_exc()
-        time.sleep(POLL_INTERVAL)
+    print(
+        f"[PROCESSOR] Background worker started "
+        f"(pool size {WORKER_POOL_SIZE}, safety poll every {POLL_INTERVAL}s)"
+    )
+    threading.Thread(target=_heartbeat_loop, name="lease-heartbeat", daemon=True).start()
+    in_flight: set = set()
+    with ThreadPoolExecutor(max_workers=WORKER_POOL_SIZE,
+                            thread_name_prefix="doc-processor") as pool:
+        while True:
+            _wake_event.clear()
+            in_flight = {f for f in in_flight if not f.done()}
+            free_slots = WORKER_POOL_SIZE - len(in_flight)
+            try:
+                if free_slots > 0:
+                    in_flight.update(_poll_once(pool, free_slots))
+            except Exception as exc:
+                print(f"[PROCESSOR] Unhandled error in poll loop: {exc}")
+                traceback.print_exc()
+
+            # Sleep until a new upload is signalled, a running document
+            # finishes (freeing a slot), a backed-off document becomes due
+            # or the safety poll interval elapses.
+            timeout = POLL_INTERVAL
+            if len(in_flight) < WORKER_POOL_SIZE:
+                retry_in = _next_retry_in()
+                if retry_in is not None:
+                    timeout = min(timeout, retry_in + 1)
+            _wake_event.wait(timeout)
 
 
 def start_background_worker():
     """Start the processor as a daemon thread so it dies with the main process."""
     t = threading.Thread(target=_run_loop, name="doc-processor", daemon=True)
     t.start()
+    if DATABASE_URL and psycopg is not None:
+        threading.Thread(target=_listen_loop, name="doc-listener", daemon=True).start()
     print("[PROCESSOR] Daemon thread launched.")
     return t
+
+
+def _exit_on_sigterm(signum, frame):
+    print("[PROCESSOR] SIGTERM – finishing documents in flight …")
+    raise SystemExit(0)
+
+
+def main():
+    """
+    Run the processor in the foreground; started by ``python -m workers``
+    (workers/__main__.py) from the backend directory.  Any number of these
+    may run alongside API processes started with EMBEDDED_WORKER=0.  SIGTERM
+    or Ctrl-C stops claiming and waits for the documents in flight.
+    """
+    signal.signal(signal.SIGTERM, _exit_on_sigterm)
+    if DATABASE_URL and psycopg is not None:
+        threading.Thread(target=_listen_loop, name="doc-listener", daemon=True).start()
+    else:
+        print(
+            f"[PROCESSOR] DATABASE_URL/psycopg not available – new uploads are "
+            f"picked up by the {POLL_INTERVAL}s poll"
+        )
+    try:
+        _run_loop()
+    except (KeyboardInterrupt, SystemExit):
+        print("[PROCESSOR] Stopped.")
+
+
+if __name__ == "__main__":
+    # Running this module directly would make every spawned PDF extraction
+    # process re-import it (and the API client) – see workers/__main__.py.
+    raise SystemExit("Start the standalone worker with `python -m workers` from the backend directory.")
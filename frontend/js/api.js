@@ -94,4 +94,82 @@ async function request(path, options = {}) {
   return data;
 }
 
-export { Session, request, clearCache };
+// ── Notification stream ──────────────────────────────────────────────────────
+// One shared EventSource per page; listeners get onOpen on every (re)connect
+// (reload /notifications then) and onNotification for each new row.  The
+// stream is opened with a single-use ticket, never with the access token:
+// URLs end up in server and proxy logs.
+const RECONNECT_DELAY = 5_000;
+
+const _notifListeners = new Set();
+let _notifSource = null;
+let _notifRetry  = null;
+
+async function _streamTicket(token) {
+  // Plain fetch: request() would clear the response cache on every POST
+  const res = await fetch(`${API_BASE}/notifications/stream-ticket`, {
+    method: "POST",
+    headers: { Authorization: `Bearer ${token}` },
+  });
+  if (!res.ok) throw new Error(await res.text());
+  return (await res.json()).ticket;
+}
+
+function _retryNotificationStream() {
+  if (_notifListeners.size > 0 && !_notifRetry) {
+    _notifRetry = setTimeout(_openNotificationStream, RECONNECT_DELAY);
+  }
+}
+
+async function _openNotificationStream() {
+  _notifRetry = null;
+  const session = await Session.get();
+  const token = session?.access_token;
+  if (!token || _notifListeners.size === 0 || _notifSource) return;
+
+  let ticket;
+  try {
+    ticket = await _streamTicket(token);
+  } catch (err) {
+    console.warn("Could not open the notification stream", err);
+    _retryNotificationStream();
+    return;
+  }
+  if (_notifListeners.size === 0 || _notifSource) return;
+
+  const url = `${API_BASE}/notifications/stream?ticket=${encodeURIComponent(ticket)}`;
+  const source = new EventSource(url);
+  _notifSource = source;
+
+  source.onopen = () => {
+    clearCache("/notifications");
+    _notifListeners.forEach(l => l.onOpen?.());
+  };
+  source.addEventListener("notification", (e) => {
+    clearCache("/notifications");
+    let row;
+    try { row = JSON.parse(e.data); } catch (_) { return; }
+    _notifListeners.forEach(l => l.onNotification?.(row));
+  });
+  // The server ends streams periodically; reconnect with a new ticket
+  // rather than letting EventSource reuse the spent one baked into the URL.
+  source.onerror = () => {
+    source.close();
+    if (_notifSource === source) _notifSource = null;
+    _retryNotificationStream();
+  };
+}
+
+function subscribeNotifications(listener) {
+  _notifListeners.add(listener);
+  if (!_notifSource && !_notifRetry) _openNotificationStream();
+  return () => {
+    _notifListeners.delete(listener);
+    if (_notifListeners.size === 0 && _notifSource) {
+      _notifSource.close();
+      _notifSource = null;
+    }
+  };
+}
+
+export { Session, request, clearCache, subscribeNotifications };
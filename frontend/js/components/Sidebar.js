@@ -194,29 +194,42 @@ export default function Sidebar({ onSelect }) {
 
   aside.append(toggle, nav);
 
-  // Poll for unread notification count every 60 seconds.
-  // Self-cancels once the sidebar element is detached from the DOM.
-  async function pollUnreadCount() {
+  // Unread notification count: loaded on every stream (re)connect and bumped
+  // for each pushed row.  Unsubscribes once the sidebar is detached.
+  let unreadCount = 0;
+
+  function renderUnreadCount() {
+    const badge = aside.querySelector("#notif-badge");
+    if (badge) {
+      badge.textContent = unreadCount > 99 ? "99+" : String(unreadCount);
+      badge.classList.toggle("visible", unreadCount > 0);
+    }
+  }
+
+  async function loadUnreadCount() {
     try {
       const { request } = await import("../api.js");
       const notifs = await request("/notifications");
-      const unread = (notifs || []).filter(n => !n.is_read).length;
-      const badge = aside.querySelector("#notif-badge");
-      if (badge) {
-        badge.textContent = unread > 99 ? "99+" : String(unread);
-        badge.classList.toggle("visible", unread > 0);
-      }
+      unreadCount = (notifs || []).filter(n => !n.is_read).length;
+      renderUnreadCount();
     } catch (_) { /* best-effort */ }
   }
 
-  pollUnreadCount();
-  const _pollInterval = setInterval(() => {
-    if (!aside.isConnected) {
-      clearInterval(_pollInterval);
-      return;
-    }
-    pollUnreadCount();
-  }, 60000);
+  import("../api.js").then(({ subscribeNotifications }) => {
+    const unsubscribe = subscribeNotifications({
+      onOpen: () => {
+        if (!aside.isConnected) return unsubscribe();
+        loadUnreadCount();
+      },
+      onNotification: (n) => {
+        if (!aside.isConnected) return unsubscribe();
+        if (!n.is_read) {
+          unreadCount += 1;
+          renderUnreadCount();
+        }
+      },
+    });
+  });
 
   return aside;
 }
@@ -1,4 +1,4 @@
-import { request, clearCache } from "../../api.js";
+import { request, clearCache, subscribeNotifications } from "../../api.js";
 
 /* ======================
    Documents UI
@@ -244,6 +244,12 @@ const documentsCSS = `
   }
 }
 
+.docs-load-more {
+  display: flex;
+  justify-content: center;
+  margin-top: 16px;
+}
+
 .docs-column {
   background: #f9fafb;
   padding: 16px;
@@ -646,6 +652,15 @@ const documentsCSS = `
   background: #dbeafe;
 }
 
+/* Failed processing – red accent, read or unread */
+.notif-item.failed {
+  border-left: 3px solid #dc2626;
+}
+
+.notif-item.failed .notif-item-title {
+  color: #b91c1c;
+}
+
 .notif-item-title {
   font-weight: 700;
   color: #1f2937;
@@ -774,6 +789,9 @@ export function Documents(container) {
         <h3>Local University Documents</h3>
       </div>
     </div>
+    <div class="docs-load-more">
+      <button class="btn-secondary" id="loadMoreDocsBtn" style="display:none;">Load more</button>
+    </div>
   `;
 
   wrapper.appendChild(card);
@@ -793,6 +811,7 @@ export function Documents(container) {
   const descriptionTypeFilter = card.querySelector("#descriptionTypeFilter");
   const globalColumn          = card.querySelector("#globalDocs");
   const localColumn           = card.querySelector("#localDocs");
+  const loadMoreDocsBtn       = card.querySelector("#loadMoreDocsBtn");
 
   const fileInput             = card.querySelector("#fileInput");
   const uploadOptions         = card.querySelector("#uploadOptions");
@@ -812,6 +831,8 @@ export function Documents(container) {
 
   let globalDocs      = [];
   let localDocs       = [];
+  let nextCursor      = null;   // cursor of the next /documents-visible-to-user page
+  let loadingMore     = false;
   let documentGroups  = [];
   let selectedGroupId = null;
   let uploadMode      = "new";
@@ -833,24 +854,64 @@ export function Documents(container) {
      Load Documents
   ====================== */
 
+  async function fetchDocumentsPage(cursor) {
+    const path = cursor
+      ? `/documents-visible-to-user?cursor=${encodeURIComponent(cursor)}`
+      : "/documents-visible-to-user";
+    const response = await request(path, { method: "GET" });
+    if (Array.isArray(response)) return { docs: response, cursor: null };
+    return {
+      docs:   response?.documents || response?.items || [],
+      cursor: response?.next_cursor || null,
+    };
+  }
+
+  // The endpoint is paginated: render the first page at once, and fetch the
+  // next one when the user asks for more
   async function loadDocuments() {
     try {
-      const response = await request("/documents-visible-to-user", { method: "GET" });
-      const data = Array.isArray(response)
-        ? response
-        : (response?.documents || response?.items || []);
-
-      globalDocs = data.filter(doc => doc.scope === "global");
-      localDocs  = data.filter(doc => doc.scope === "local");
-
+      const page = await fetchDocumentsPage(null);
+      globalDocs = page.docs.filter(doc => doc.scope === "global");
+      localDocs  = page.docs.filter(doc => doc.scope === "local");
+      nextCursor = page.cursor;
       performSearch();
     } catch (err) {
       console.error("loadDocuments error:", err);
+      nextCursor = null;
       renderDocs([], globalColumn, "Global Documents");
       renderDocs([], localColumn, "Local University Documents");
+      updateLoadMore();
     }
   }
 
+  async function loadMoreDocuments() {
+    if (!nextCursor || loadingMore) return;
+    loadingMore = true;
+    loadMoreDocsBtn.disabled    = true;
+    loadMoreDocsBtn.textContent = "Loading…";
+    const cursor = nextCursor;
+    try {
+      const page = await fetchDocumentsPage(cursor);
+      // A refresh or a search replaced the list meanwhile
+      if (nextCursor !== cursor) return;
+      globalDocs = globalDocs.concat(page.docs.filter(doc => doc.scope === "global"));
+      localDocs  = localDocs.concat(page.docs.filter(doc => doc.scope === "local"));
+      nextCursor = page.cursor;
+      performSearch();
+    } catch (err) {
+      console.error("loadMoreDocuments error:", err);
+    } finally {
+      loadingMore = false;
+      loadMoreDocsBtn.disabled    = false;
+      loadMoreDocsBtn.textContent = "Load more";
+      updateLoadMore();
+    }
+  }
+
+  function updateLoadMore() {
+    loadMoreDocsBtn.style.display = nextCursor ? "" : "none";
+  }
+
   /* ======================
      Access Control
   ====================== */
@@ -1151,6 +1212,7 @@ export function Documents(container) {
 
     renderDocs(applyFilters(globalDocs), globalColumn, "Global Documents");
     renderDocs(applyFilters(localDocs),  localColumn,  "Local University Documents");
+    updateLoadMore();
   }
 
   /* ======================
@@ -1174,6 +1236,7 @@ export function Documents(container) {
       const data = Array.isArray(results) ? results : [];
       globalDocs = data.filter(d => d.scope === "global");
       localDocs  = data.filter(d => d.scope === "local");
+      nextCursor = null;
       performSearch();
     } catch (err) {
       console.error("Semantic search failed", err);
@@ -1206,6 +1269,7 @@ export function Documents(container) {
       const data = Array.isArray(results) ? results : [];
       globalDocs = data.filter(d => d.scope === "global");
       localDocs  = data.filter(d => d.scope === "local");
+      nextCursor = null;
       performSearch();
     } catch (err) {
       console.error("Text search failed", err);
@@ -1221,6 +1285,7 @@ export function Documents(container) {
 
   semanticSearchBtn.addEventListener("click", performSemanticSearch);
   textSearchBtn.addEventListener("click", performTextSearch);
+  loadMoreDocsBtn.addEventListener("click", loadMoreDocuments);
 
   searchInput.addEventListener("keydown", e => {
     if (e.key === "Enter") performSemanticSearch();
@@ -1441,7 +1506,7 @@ export function Documents(container) {
         : "";
 
       const el = document.createElement("div");
-      el.className   = `notif-item ${n.is_read ? "" : "unread"}`;
+      el.className   = `notif-item ${n.is_read ? "" : "unread"} ${n.type === "file_failed" ? "failed" : ""}`;
       el.dataset.nid = n.notification_id;
       el.innerHTML   = `
         <div class="notif-item-title">${n.title}</div>
@@ -1507,9 +1572,24 @@ export function Documents(container) {
   async function init() {
     await loadProfile();
     await loadDocuments();
-    // Poll for notifications immediately, then every 30 s
-    pollNotifications();
-    setInterval(pollNotifications, 30000);
+    if (!card.isConnected) return;
+    // Count unread once per stream (re)connect, then follow pushed rows.
+    // The view has no teardown hook; like the sidebar, it unsubscribes on
+    // the first event after it was replaced.
+    const unsubscribe = subscribeNotifications({
+      onOpen: () => {
+        if (!card.isConnected) return unsubscribe();
+        pollNotifications();
+      },
+      onNotification: (n) => {
+        if (!card.isConnected) return unsubscribe();
+        if (n.is_read) return;
+        const shown  = notifBadge.style.display === "none" ? 0 : parseInt(notifBadge.textContent, 10) || 0;
+        const unread = shown + 1;
+        notifBadge.textContent   = unread;
+        notifBadge.style.display = "inline-flex";
+      },
+    });
   }
 
   init();
@@ -97,6 +97,19 @@ const notifCSS = `
     background: #e0e7ff;
   }
 
+  /* Failed processing – red accent, read or unread */
+  .notif-item.failed {
+    border-left: 3px solid #dc2626;
+  }
+
+  .notif-item.failed .notif-title {
+    color: #b91c1c;
+  }
+
+  .notif-item.failed .notif-dot {
+    background: #dc2626;
+  }
+
   .notif-dot {
     flex-shrink: 0;
     width: 10px;
@@ -220,7 +233,7 @@ export async function Notifications(container) {
     listEl.innerHTML = "";
     for (const n of notifs) {
       const item = document.createElement("div");
-      item.className = `notif-item${n.is_read ? "" : " unread"}`;
+      item.className = `notif-item${n.is_read ? "" : " unread"}${n.type === "file_failed" ? " failed" : ""}`;
 
       const dot = document.createElement("div");
       dot.className = "notif-dot";